@@ -7,12 +7,14 @@ class City:
         pos (tuple): The coordinates or position of the city.
         color (str): The color associated with the city.
         connections (list): A list of city names directly connected to this city.
+        cubes (list): The yellow, blue and red infection cubes present in the city, indexed by color id.
+            This is the city's row of Board.cubes when the city belongs to a board.
         infection_red (int): The number of red infection cubes present in the city.
         infection_blue (int): The number of blue infection cubes present in the city.
         infection_yellow (int): The number of yellow infection cubes present in the city.
     """
 
-    def __init__(self, name, pos, color, connections):
+    def __init__(self, name, pos, color, connections, cubes=None):
         """
         Initialize a City instance.
 
@@ -21,6 +23,8 @@ class City:
             pos (tuple): The coordinates (e.g., (x, y)) of the city.
             color (str): The color associated with the city.
             connections (list): A list of city names that are directly connected to this city.
+            cubes (list or None): The [yellow, blue, red] cube counts to share with the board
+                (Board.cubes[city id]). A new zeroed list if None.
         """
         self.name = name
         self.pos = pos
@@ -31,7 +35,30 @@ class City:
         if self.color_encoder == -1:
             raise ValueError("Invalid color for city")
 
-        # Initialize infection levels for each disease color to zero.
-        self.infection_red = 0
-        self.infection_blue = 0
-        self.infection_yellow = 0
\ No newline at end of file
+        # Infection levels for each disease color, zero for a new game.
+        self.cubes = cubes if cubes is not None else [0, 0, 0]
+
+    # Per-color views of the cube counts.
+    @property
+    def infection_yellow(self):
+        return self.cubes[0]
+
+    @infection_yellow.setter
+    def infection_yellow(self, value):
+        self.cubes[0] = value
+
+    @property
+    def infection_blue(self):
+        return self.cubes[1]
+
+    @infection_blue.setter
+    def infection_blue(self, value):
+        self.cubes[1] = value
+
+    @property
+    def infection_red(self):
+        return self.cubes[2]
+
+    @infection_red.setter
+    def infection_red(self, value):
+        self.cubes[2] = value
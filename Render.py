@@ -1,36 +1,23 @@
-from constants import COLORS, CITIES, COLOR_HEX
+from constants import COLORS, COLOR_HEX
+from topology import GRAPH
 import networkx as nx
 import matplotlib.pyplot as plt
 
 class Renderer:
     """
     Responsible for rendering the game map, including cities, players, infection information, and decks.
-    Utilizes networkx to generate the city network and matplotlib for drawing.
+    Utilizes networkx to draw the city network and matplotlib for drawing.
     """
     
     def __init__(self):
         """
-        Initialize the Renderer by creating the network graph of cities.
+        Initialize the Renderer with the network graph of cities.
         """
-        self.graph = self.create_graph()
+        self.graph = GRAPH
         # Enable interactive mode in matplotlib and create a figure.
         plt.ion()
         plt.figure(figsize=(18, 12))
 
-    def create_graph(self):
-        """
-        Create a network graph of the cities based on their connections.
-
-        Returns:
-            networkx.Graph: A graph with cities as nodes and connections as edges.
-        """
-        graph = nx.Graph()
-        # Iterate through each city and its neighbors to add edges.
-        for city in CITIES.keys():
-            for neighbor in CITIES[city]:
-                graph.add_edge(city, neighbor)
-        return graph
-
     def draw_city_labels(self, cities):
         """
         Draw labels for each city on the map.
@@ -247,3 +234,9 @@ class Renderer:
 
         # Wait for a button press (key or mouse click) before continuing.
         plt.waitforbuttonpress()
+
+    def close(self):
+        """
+        Close the game map figure.
+        """
+        plt.close()
@@ -0,0 +1,42 @@
+import numpy as np
+from topology import CITY_NAMES, COLOR_NAMES, N_CITIES
+
+# Action kinds.
+DRIVE, DIRECT, CHARTER, TREAT, SHARE, FIND = range(6)
+MOVE_KINDS = (DRIVE, DIRECT, CHARTER)
+
+# Action index layout: 24 DRIVE, 24 DIRECT FLIGHT, 24 CHARTER FLIGHT (one per city),
+# 3 TREAT and 3 FIND CURE (one per color) around a single SHARE KNOWLEDGE.
+DRIVE_OFFSET = 0
+DIRECT_OFFSET = N_CITIES
+CHARTER_OFFSET = 2 * N_CITIES
+TREAT_OFFSET = 3 * N_CITIES
+SHARE_ACTION = TREAT_OFFSET + len(COLOR_NAMES)
+FIND_OFFSET = SHARE_ACTION + 1
+N_ACTIONS = FIND_OFFSET + len(COLOR_NAMES)
+
+# Pre-decoded (kind, target city id, color id) record of every action; -1 when not applicable.
+ACTIONS = tuple(
+    [(kind, city, -1) for kind in MOVE_KINDS for city in range(N_CITIES)]
+    + [(TREAT, -1, color) for color in range(len(COLOR_NAMES))]
+    + [(SHARE, -1, -1)]
+    + [(FIND, -1, color) for color in range(len(COLOR_NAMES))]
+)
+
+# Human-readable action names, as shown to players and in logs.
+ACTION_NAMES = tuple(
+    [f"{action} TO {city}" for action in ["DRIVE", "DIRECT FLIGHT", "CHARTER FLIGHT"] for city in CITY_NAMES]
+    + [f"TREAT {color}" for color in COLOR_NAMES]
+    + ["SHARE KNOWLEDGE"]
+    + [f"FIND CURE {color}" for color in COLOR_NAMES]
+)
+ACTION_INDEX = {name: idx for idx, name in enumerate(ACTION_NAMES)}
+
+# The same table as arrays, for vectorized code.
+ACTION_KIND = np.array([kind for kind, _, _ in ACTIONS], dtype=np.int8)
+ACTION_TARGET = np.array([target for _, target, _ in ACTIONS], dtype=np.int8)
+ACTION_COLOR = np.array([color for _, _, color in ACTIONS], dtype=np.int8)
+for _table in (ACTION_KIND, ACTION_TARGET, ACTION_COLOR):
+    _table.setflags(write=False)
+
+assert len(ACTIONS) == len(ACTION_NAMES) == N_ACTIONS == 79
@@ -0,0 +1,358 @@
+"""
+Benchmark suite for the environment, the game engine and the search agents.
+
+Every benchmark plays seeded games, so two runs measure the same work. Results are written
+to a JSON file that later runs can be compared against:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --output current.json --baseline baseline.json --threshold 0.1
+
+The comparison exits with status 1 if any metric got worse by more than the threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from env import PandemicEnv
+import beam
+import dfs_top_k
+import greedy
+
+# Agents benchmarked, by name.
+AGENTS = {
+    "beam": beam.BeamSearchAgent,
+    "dfs_top_k": dfs_top_k.GreedyAgent,
+    "greedy": greedy.GreedyAgent,
+}
+
+
+def _metric(value, unit, higher_is_better):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _stat(value, unit):
+    return {"value": value, "unit": unit}
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def _random_step(env, rng):
+    """
+    Take one uniformly random valid action.
+    """
+    action = int(rng.choice(np.flatnonzero(env.valid_action_mask())))
+    return env.step(action)
+
+
+def collect_states(seed, n_states):
+    """
+    Play seeded random games and capture a snapshot of every state reached.
+
+    Returns:
+        tuple: The environment and the list of snapshots.
+    """
+    env = PandemicEnv()
+    rng = np.random.default_rng(seed)
+    env.reset(seed=seed)
+    states = []
+    episode = 0
+    while len(states) < n_states:
+        states.append(env.snapshot())
+        _, _, done, _, _ = _random_step(env, rng)
+        if done:
+            episode += 1
+            env.reset(seed=seed + episode)
+    return env, states
+
+
+def collect_turns(seed, n_turns):
+    """
+    Play seeded random games and capture every complete turn: a snapshot of the state it
+    starts in and the actions taken.
+
+    Returns:
+        tuple: The environment and the list of (snapshot, actions) turns.
+    """
+    env = PandemicEnv()
+    rng = np.random.default_rng(seed)
+    env.reset(seed=seed)
+    turns = []
+    episode = 0
+    state, actions = env.snapshot(), []
+    while len(turns) < n_turns:
+        actions.append(int(rng.choice(np.flatnonzero(env.valid_action_mask()))))
+        _, _, done, _, _ = env.step(actions[-1])
+        if done:
+            episode += 1
+            env.reset(seed=seed + episode)
+        elif env.actions_taken == 0:
+            turns.append((state, actions))
+        if done or env.actions_taken == 0:
+            state, actions = env.snapshot(), []
+    return env, turns
+
+
+def bench_env(seed, n_steps):
+    """
+    Time the PandemicEnv entry points.
+
+    Parameters:
+        seed (int): Seed of the first game.
+        n_steps (int): Number of calls timed for each entry point.
+
+    Returns:
+        dict: The calls/sec of reset, step, get_observation, valid_action_mask and select_discard,
+        and the turns/sec of step_turn.
+    """
+    results = {}
+    env = PandemicEnv()
+
+    # reset: a new seeded game per call.
+    start = time.perf_counter()
+    for i in range(n_steps // 10):
+        env.reset(seed=seed + i)
+    results["env.reset"] = _metric(_rate(n_steps // 10, time.perf_counter() - start), "calls/s", True)
+
+    # step: only the step() calls of seeded random games are timed.
+    rng = np.random.default_rng(seed)
+    env.reset(seed=seed)
+    elapsed, episode = 0.0, 0
+    for _ in range(n_steps):
+        action = int(rng.choice(np.flatnonzero(env.valid_action_mask())))
+        start = time.perf_counter()
+        _, _, done, _, _ = env.step(action)
+        elapsed += time.perf_counter() - start
+        if done:
+            episode += 1
+            env.reset(seed=seed + episode)
+    results["env.step"] = _metric(_rate(n_steps, elapsed), "calls/s", True)
+
+    # step_turn: the complete turns of seeded random games, replayed from the state they start in.
+    env, turns = collect_turns(seed, n_steps // 4)
+    elapsed = 0.0
+    for state, actions in turns:
+        env.restore(state)
+        env.get_observation()
+        start = time.perf_counter()
+        env.step_turn(actions)
+        elapsed += time.perf_counter() - start
+    results["env.step_turn"] = _metric(_rate(len(turns), elapsed), "turns/s", True)
+
+    # get_observation and valid_action_mask on the states of random games, computed from scratch.
+    env, states = collect_states(seed, n_steps)
+    elapsed_obs = elapsed_mask = 0.0
+    for state in states:
+        env.restore(state)
+        start = time.perf_counter()
+        env.get_observation()
+        elapsed_obs += time.perf_counter() - start
+
+        env.current_player.mask_key = None
+        start = time.perf_counter()
+        env.valid_action_mask()
+        elapsed_mask += time.perf_counter() - start
+    results["env.get_observation"] = _metric(_rate(len(states), elapsed_obs), "calls/s", True)
+    results["env.valid_action_mask"] = _metric(_rate(len(states), elapsed_mask), "calls/s", True)
+
+    # select_discard on hands topped up to 7-9 cards from the player deck.
+    rng = np.random.default_rng(seed)
+    elapsed, calls = 0.0, 0
+    for i in range(n_steps // 10):
+        env.reset(seed=seed + i)
+        player = env.players[i % 2]
+        for _ in range(7 - len(player.hand) + int(rng.integers(0, 3))):
+            player.add_card(env.board.player_deck.pop())
+        start = time.perf_counter()
+        env.select_discard(player.id, player.hand)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    results["env.select_discard"] = _metric(_rate(calls, elapsed), "calls/s", True)
+
+    return results
+
+
+def bench_episodes(seed, n_episodes):
+    """
+    Play full seeded games with random actions.
+
+    Returns:
+        dict: Episodes/sec and the steps/sec they imply.
+    """
+    env = PandemicEnv()
+    steps = 0
+    start = time.perf_counter()
+    for i in range(n_episodes):
+        env.reset(seed=seed + i)
+        done = False
+        while not done:
+            player = env.current_player
+            _, _, done, _, _ = env.step(player.random_action(player.action_mask(env.board, env.cities)))
+            steps += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "episodes": _metric(_rate(n_episodes, elapsed), "episodes/s", True),
+        "episodes.steps": _metric(_rate(steps, elapsed), "steps/s", True),
+    }
+
+
+def bench_agent(name, seed, n_decisions):
+    """
+    Time the decisions of a search agent along seeded games.
+
+    Each decision is one select_best_4step_sequence() call. The chosen actions are then played
+    a turn at a time with step_turn(), until one is no longer valid or the game ends.
+
+    Returns:
+        tuple: The timed metrics (nodes/sec and the 50th, 90th and 99th percentile decision
+        latency) and, for agents with them, the search statistics: the hit rate of the
+        transposition table and the pruning counters.
+    """
+    env = PandemicEnv()
+    agent = AGENTS[name](env)
+    env.reset(seed=seed)
+    episode = 0
+    latencies = []
+    for _ in range(n_decisions):
+        start = time.perf_counter()
+        sequence = agent.select_best_4step_sequence()
+        latencies.append(time.perf_counter() - start)
+
+        done = False
+        while sequence and not done:
+            turn = sequence[:4 - env.actions_taken]
+            sequence = sequence[len(turn):]
+            _, _, done, _, info = env.step_turn(turn, stop_at_invalid=True)
+            if info["applied"] < len(turn):
+                break
+        if done:
+            episode += 1
+            env.reset(seed=seed + episode)
+
+    latencies = np.array(latencies) * 1000
+    results = {f"{name}.nodes": _metric(_rate(agent.nodes, latencies.sum() / 1000), "nodes/s", True)}
+    for percentile in (50, 90, 99):
+        results[f"{name}.latency_p{percentile}"] = _metric(float(np.percentile(latencies, percentile)), "ms", False)
+
+    # Search statistics describe how the search went, not how fast: better move ordering can
+    # lower the cutoffs while the agent gets faster, so they are reported but never compared.
+    stats = {}
+    if hasattr(agent, "tt"):
+        stats[f"{name}.tt_hit_rate"] = _stat(agent.tt.hit_rate, "fraction")
+    if hasattr(agent, "pruner"):
+        pruned = sum(agent.pruner.stats().values())
+        stats[f"{name}.pruned"] = _stat(pruned / n_decisions, "actions/decision")
+    if hasattr(agent, "cutoffs"):
+        stats[f"{name}.cutoffs"] = _stat(agent.cutoffs / n_decisions, "states/decision")
+    return results, stats
+
+
+def run(seed=0, n_steps=2000, n_episodes=200, n_decisions=10, agents=tuple(AGENTS)):
+    """
+    Run every benchmark.
+
+    Returns:
+        dict: The benchmark report, with run metadata, one entry per timed metric under
+        "results" and the informational search statistics under "stats".
+    """
+    results, stats = {}, {}
+    results.update(bench_env(seed, n_steps))
+    results.update(bench_episodes(seed, n_episodes))
+    for name in agents:
+        agent_results, agent_stats = bench_agent(name, seed, n_decisions)
+        results.update(agent_results)
+        stats.update(agent_stats)
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "n_steps": n_steps,
+            "n_episodes": n_episodes,
+            "n_decisions": n_decisions,
+        },
+        "results": results,
+        "stats": stats,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare a report against a baseline report.
+
+    Only the timed metrics under "results" are compared; the search statistics under "stats"
+    are informational.
+
+    Parameters:
+        report (dict): The current benchmark report.
+        baseline (dict): The reference benchmark report.
+        threshold (float): Relative slowdown above which a metric counts as a regression.
+
+    Returns:
+        list: (metric, baseline value, current value, speedup) for every regressed metric.
+    """
+    regressions = []
+    print(f"{'metric':<28}{'baseline':>14}{'current':>14}{'speedup':>10}")
+    for metric, current in report["results"].items():
+        reference = baseline["results"].get(metric)
+        if reference is None:
+            print(f"{metric:<28}{'-':>14}{current['value']:>14.2f}{'new':>10}")
+            continue
+        # Speedup > 1 means faster, whichever direction the metric is measured in.
+        if current["higher_is_better"]:
+            speedup = current["value"] / reference["value"] if reference["value"] else float("inf")
+        else:
+            speedup = reference["value"] / current["value"] if current["value"] else float("inf")
+        flag = "  REGRESSION" if speedup < 1 - threshold else ""
+        print(f"{metric:<28}{reference['value']:>14.2f}{current['value']:>14.2f}{speedup:>9.2f}x{flag}")
+        if flag:
+            regressions.append((metric, reference["value"], current["value"], speedup))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Pandemic environment and agents.")
+    parser.add_argument("--output", default="benchmark.json", help="Where to write the JSON report.")
+    parser.add_argument("--baseline", default=None, help="A previous JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown that counts as a regression (default: 0.1, i.e. 10%%).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=2000, help="Calls timed per env entry point.")
+    parser.add_argument("--episodes", type=int, default=200, help="Full random games played.")
+    parser.add_argument("--decisions", type=int, default=10, help="Decisions timed per agent.")
+    parser.add_argument("--agents", nargs="*", default=list(AGENTS), choices=list(AGENTS),
+                        help="Agents to benchmark (default: all).")
+    args = parser.parse_args()
+
+    report = run(args.seed, args.steps, args.episodes, args.decisions, args.agents)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = []
+    if args.baseline is None:
+        for metric, result in report["results"].items():
+            print(f"{metric:<28}{result['value']:>14.2f} {result['unit']}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+
+    # Search statistics, for information only.
+    for stat, result in report["stats"].items():
+        print(f"{stat:<28}{result['value']:>14.2f} {result['unit']}")
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,10 @@
-import random
+from collections import deque
+import numpy as np
 from constants import POSITIONS, CITIES
+from topology import CARD_COLORS, CITY_COLORS, CITY_INDEX, NEIGHBORS, N_CITIES
+
+# Bitmask of the neighbors of each city id.
+NEIGHBOR_BITS = tuple(sum(1 << neighbor for neighbor in neighbors) for neighbors in NEIGHBORS)
 
 SCALING_FACTOR = 75
 
@@ -10,18 +15,23 @@ class Board:
     cure statuses, and various decks (player and infection decks).
     """
 
-    def __init__(self):
+    def __init__(self, rng=None):
         """
         Initialize the game board with default epidemic counters, disease cube counts,
         cure statuses, city positions, and decks.
+
+        Parameters:
+            rng (numpy.random.Generator): Source of every shuffle on this board, normally the
+                environment's np_random. A fresh unseeded generator is used if None.
         """
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.epidemic_count = 0
         self.outbreak_count = 0
         self.infection_rate = 0
         self.infection_rate_track = [2, 2, 3, 4]  # Infection rate increases with each epidemic.
-        self.yellow_cubes = 16
-        self.blue_cubes = 16
-        self.red_cubes = 16
+        self.cube_supply = [16, 16, 16]     # Cubes left in the supply, indexed by color id.
+        # Infection cubes on the map, indexed [city id][color id]. Each City of the game shares its row.
+        self.cubes = [[0, 0, 0] for _ in range(N_CITIES)]
         self.yellow_cure = False
         self.blue_cure = False
         self.red_cure = False
@@ -35,10 +45,35 @@ class Board:
         # Create and shuffle the infection deck.
         self.infection_deck = self.create_infection_deck()
 
-        # Initialize the infection discard pile and outbreak tracking.
+        # Initialize the infection and player discard piles.
         self.infection_discard_pile = []
         self.player_discard_pile = []
-        self.outbreak_track = []
+        self.discard_color_counts = [0, 0, 0]   # Cards of each color id in player_discard_pile.
+
+    # Per-color views of the cube supply.
+    @property
+    def yellow_cubes(self):
+        return self.cube_supply[0]
+
+    @yellow_cubes.setter
+    def yellow_cubes(self, value):
+        self.cube_supply[0] = value
+
+    @property
+    def blue_cubes(self):
+        return self.cube_supply[1]
+
+    @blue_cubes.setter
+    def blue_cubes(self, value):
+        self.cube_supply[1] = value
+
+    @property
+    def red_cubes(self):
+        return self.cube_supply[2]
+
+    @red_cubes.setter
+    def red_cubes(self, value):
+        self.cube_supply[2] = value
 
     def calculate_positions(self):
         """
@@ -52,6 +87,40 @@ class Board:
             for city, (lon, lat) in POSITIONS.items()
         }
 
+    def discard_card(self, card):
+        """
+        Put a player card on the player discard pile.
+
+        Parameters:
+            card (str): The city card.
+        """
+        self.player_discard_pile.append(card)
+        self.discard_color_counts[CARD_COLORS[card]] += 1
+
+    def undo_discards(self, n_cards):
+        """
+        Take back the last n_cards cards put on the player discard pile.
+
+        Parameters:
+            n_cards (int): The number of cards to take back.
+        """
+        pile = self.player_discard_pile
+        for card in pile[len(pile) - n_cards:]:
+            self.discard_color_counts[CARD_COLORS[card]] -= 1
+        del pile[len(pile) - n_cards:]
+
+    def set_player_discard_pile(self, cards):
+        """
+        Replace the player discard pile, recounting its colors.
+
+        Parameters:
+            cards (iterable): The city cards of the new pile, bottom first.
+        """
+        self.player_discard_pile = list(cards)
+        self.discard_color_counts = [0, 0, 0]
+        for card in self.player_discard_pile:
+            self.discard_color_counts[CARD_COLORS[card]] += 1
+
     def draw_player_deck(self, player, cities):
         """
         Draw two cards from the player deck and handle Epidemic cards.
@@ -73,14 +142,14 @@ class Board:
         for _ in range(2):
             drawn_card = self.player_deck.pop()
             if drawn_card != "Epidemic":
-                player.hand.append(drawn_card)
+                player.add_card(drawn_card)
             else:
                 # Handle the Epidemic card.
                 self.epidemic_count += 1
                 self.infection_rate += 1
                 self.draw_epidemic_deck(cities, n_draws=1, n_cubes=3, epidemic_infect=True)
                 # Shuffle the infection discard pile in-place and add it back to the infection deck.
-                random.shuffle(self.infection_discard_pile)
+                self.rng.shuffle(self.infection_discard_pile)
                 self.infection_deck.extend(self.infection_discard_pile)
                 self.infection_discard_pile = []
 
@@ -92,7 +161,8 @@ class Board:
           - If epidemic_infect is True, pop a card from the front of the infection deck.
           - Otherwise, pop a card from the end.
           - Add the drawn card to the infection discard pile.
-          - Find the corresponding city and add infection cubes.
+          - Add infection cubes to the corresponding city, unless the Quarantine Specialist
+            protects it (their city and its neighbors, except during epidemics).
           - If the city already has 3 cubes of that color, trigger an outbreak.
 
         Parameters:
@@ -100,101 +170,91 @@ class Board:
             n_draws (int): Number of cards to draw.
             n_cubes (int): Number of cubes to add to the infected city.
             epidemic_infect (bool): If True, pop from the beginning of the infection deck.
+            quarantine_specialist_loc (str or None): The Quarantine Specialist's city.
         """
+        protected = 0
+        if quarantine_specialist_loc is not None and not epidemic_infect:
+            quarantine_city = CITY_INDEX[quarantine_specialist_loc]
+            protected = (1 << quarantine_city) | NEIGHBOR_BITS[quarantine_city]
+
         for _ in range(n_draws):
             if epidemic_infect:
-                target_city = self.infection_deck.pop(0)
+                target_city = self.infection_deck.popleft()
                 assert not cities[target_city].ever_infected, f"Bottom pile city {target_city} has been infected before!"
             else:
                 target_city = self.infection_deck.pop()
             self.infection_discard_pile.append(target_city)
 
-            # Infect the target city.
-            for city in cities.values():
-                if (city.name == target_city and epidemic_infect) or \
-                (city.name == target_city and quarantine_specialist_loc is None) or \
-                (city.name == target_city and not epidemic_infect \
-                and quarantine_specialist_loc is not None \
-                and city.name != quarantine_specialist_loc \
-                and quarantine_specialist_loc not in city.connections):
-                    
-                    if not city.ever_infected:
-                        city.ever_infected = True
-                    # Reset outbreak tracking for this epidemic event.
-                    self.outbreak_track = []
-                    # Check the city's color and apply infection.
-                    if city.color == "YELLOW":  # Yellow city.
-                        if city.infection_yellow + n_cubes > 3:
-                            self.yellow_cubes -= 3 - city.infection_yellow
-                            city.infection_yellow = 3
-                            self.outbreak("yellow", city, cities)
-                        else:
-                            city.infection_yellow += n_cubes
-                            # assert self.yellow_cubes < n_cubes, "Not enough yellow cubes!"
-                            assert city.infection_yellow <= 3, f"Hey {city.infection_yellow} {n_cubes} {epidemic_infect}"
-                            self.yellow_cubes -= n_cubes
-                    if city.color == "BLUE":  # Blue city.
-                        if city.infection_blue + n_cubes > 3:
-                            self.blue_cubes -= 3 - city.infection_blue
-                            city.infection_blue = 3
-                            self.outbreak("blue", city, cities)
-                        else:
-                            city.infection_blue += n_cubes
-                            assert city.infection_blue <= 3, f"Hey {city.infection_blue} {n_cubes} {epidemic_infect}"
-                            self.blue_cubes -= n_cubes
-                    if city.color == "RED":  # Red city.
-                        if city.infection_red + n_cubes > 3:
-                            self.red_cubes -= 3 - city.infection_red
-                            city.infection_red = 3
-                            self.outbreak("red", city, cities)
-                        else:
-                            city.infection_red += n_cubes
-                            assert city.infection_red <= 3, f"Hey {city.infection_red} {n_cubes} {epidemic_infect}"
-                            self.red_cubes -= n_cubes
-                    # If any outbreak occurred, print the outbreak track.
-                    #if len(self.outbreak_track) > 0:
-                        #print(self.outbreak_track)
-                    break
+            target = CITY_INDEX[target_city]
+            if not protected >> target & 1:
+                cities[target_city].ever_infected = True
+                self.infect(target, n_cubes)
+
+    def infect(self, city, n_cubes):
+        """
+        Add cubes of a city's own color to it, breaking out if it would exceed 3 cubes.
 
-    def outbreak(self, color, city, cities):
+        Parameters:
+            city (int): The city id.
+            n_cubes (int): Number of cubes to add.
         """
-        Trigger an outbreak in the specified city and recursively infect connected cities.
+        color = CITY_COLORS[city]
+        cubes = self.cubes[city]
+        if cubes[color] + n_cubes > 3:
+            self.cube_supply[color] -= 3 - cubes[color]
+            cubes[color] = 3
+            self.outbreak(color, city)
+        else:
+            cubes[color] += n_cubes
+            self.cube_supply[color] -= n_cubes
+
+    def outbreak(self, color, city):
+        """
+        Trigger an outbreak in the specified city and spread it to the connected cities.
 
-        This method uses outbreak_track to avoid infinite loops.
+        Every neighbor that has not broken out yet in this chain gets one cube of the outbreak
+        color, and neighbors that already have 3 break out in turn. The chain is resolved
+        depth-first in connection order with an explicit stack, and a bitmask of the cities that
+        broke out keeps each city from breaking out twice.
 
         Parameters:
-            color (str): The color of the infection ("yellow", "blue", or "red").
-            city (City): The city where the outbreak is occurring.
-            cities (dict): Mapping from city names to City objects.
+            color (int): The color id of the infection.
+            city (int): The id of the city where the outbreak is occurring.
         """
-        # Add the current city to the outbreak tracking list.
-        self.outbreak_track.append(city.name)
+        cubes = self.cubes
+        broken_out = 1 << city
         self.outbreak_count += 1
-
-        # Infect each neighboring city.
-        for neighbor in city.connections:
-            if neighbor in self.outbreak_track:
-                continue
+        # Stack of (city, index of the next neighbor to infect).
+        stack = [(city, 0)]
+        while stack:
+            current, position = stack[-1]
+            neighbors = NEIGHBORS[current]
+            while position < len(neighbors):
+                neighbor = neighbors[position]
+                position += 1
+                if broken_out >> neighbor & 1:
+                    continue
+                if cubes[neighbor][color] == 3:
+                    # Chain reaction: resume this city's neighbors after the neighbor's outbreak.
+                    stack[-1] = (current, position)
+                    stack.append((neighbor, 0))
+                    broken_out |= 1 << neighbor
+                    self.outbreak_count += 1
+                    break
+                cubes[neighbor][color] += 1
             else:
-                # Get the current infection count for the neighbor in the given color.
-                current_infections = getattr(cities[neighbor], f"infection_{color.lower()}")
-                if current_infections == 3:
-                    # If the neighbor already has 3 cubes, trigger a recursive outbreak.
-                    self.outbreak(color, cities[neighbor], cities)
-                else:
-                    # Otherwise, add one infection cube.
-                    setattr(cities[neighbor], f"infection_{color.lower()}", current_infections + 1)
+                stack.pop()
 
     def create_infection_deck(self):
         """
         Create and shuffle the infection deck from the list of city names.
 
         Returns:
-            list: A shuffled list of city names representing the infection deck.
+            deque: A shuffled deque of city names representing the infection deck, drawn from the end.
         """
         city_cards = list(CITIES.keys())
-        random.shuffle(city_cards)
-        return city_cards
+        self.rng.shuffle(city_cards)
+        return deque(city_cards)
 
     def create_player_deck(self):
         """
@@ -210,7 +270,7 @@ class Board:
             tuple: A tuple containing player 1's initial hand, player 2's initial hand, and the final player deck.
         """
         city_cards = list(CITIES.keys())
-        random.shuffle(city_cards)
+        self.rng.shuffle(city_cards)
 
         # Deal 3 initial cards to each player.
         init_hand_1, init_hand_2 = city_cards[:3], city_cards[3:6]
@@ -225,7 +285,7 @@ class Board:
 
         # Shuffle each pile individually.
         for pile in piles:
-            random.shuffle(pile)
+            self.rng.shuffle(pile)
 
         # Combine the piles to form the final player deck.
         player_deck = sum(piles, [])  # Flatten the list of piles.
@@ -0,0 +1,86 @@
+from topology import COLOR_NAMES
+
+N_COLORS = len(COLOR_NAMES)
+
+
+def discard_value(counts, partner_counts, cures, split):
+    """
+    Score discarding split[c] cards of each color c, as StateEvaluator.h_discard() would
+    (h_cards + 0.5 * h_disc), up to the constant contributed by the cards already discarded.
+
+    Parameters:
+        counts (sequence): Cards of each color id in the discarding player's hand.
+        partner_counts (sequence): Cards of each color id in the partner's hand.
+        cures (sequence): Cure status of each color id.
+        split (sequence): Number of cards of each color id to discard.
+
+    Returns:
+        float: The discard heuristic value (lower is better).
+    """
+    value = 0
+    for color in range(N_COLORS):
+        if not cures[color]:
+            # Card deficit of the best-stocked player, plus the cards lost to the discard pile.
+            value += max(0, 4 - max(counts[color] - split[color], partner_counts[color]))
+            value += 0.5 * split[color]
+    return value
+
+
+def optimal_discard_splits(counts, partner_counts, cures, n_discard):
+    """
+    Find the ways to split n_discard cards over the colors that minimize discard_value().
+
+    Every combination of cards with the same colors has the same value, so only the
+    (yellow, blue, red) splits are scored instead of every combination of cards.
+
+    Parameters:
+        counts (sequence): Cards of each color id in the discarding player's hand.
+        partner_counts (sequence): Cards of each color id in the partner's hand.
+        cures (sequence): Cure status of each color id.
+        n_discard (int): Number of cards to discard.
+
+    Returns:
+        tuple: The minimal value and the list of optimal splits, in increasing (yellow, blue) order.
+    """
+    best_value, best_splits = float("inf"), []
+    for y in range(min(counts[0], n_discard) + 1):
+        for b in range(min(counts[1], n_discard - y) + 1):
+            r = n_discard - y - b
+            if r > counts[2]:
+                continue
+            split = (y, b, r)
+            value = discard_value(counts, partner_counts, cures, split)
+            if value < best_value:
+                best_value, best_splits = value, [split]
+            elif value == best_value:
+                best_splits.append(split)
+    return best_value, best_splits
+
+
+def plan_discard(hand_colors, partner_counts, cures, n_discard):
+    """
+    Choose which cards of a hand to discard.
+
+    The choice is the one a scan of itertools.combinations(hand, n_discard) keeping the first
+    strictly better value makes: the lexicographically smallest tuple of hand positions among
+    the optimal splits. For a given split, that tuple holds the first cards of each color.
+
+    Parameters:
+        hand_colors (sequence): Color id of each card, in hand order.
+        partner_counts (sequence): Cards of each color id in the partner's hand.
+        cures (sequence): Cure status of each color id.
+        n_discard (int): Number of cards to discard.
+
+    Returns:
+        tuple: The hand positions of the cards to discard, in increasing order.
+    """
+    positions_by_color = [[] for _ in range(N_COLORS)]
+    for position, color in enumerate(hand_colors):
+        positions_by_color[color].append(position)
+    counts = [len(positions) for positions in positions_by_color]
+
+    _, splits = optimal_discard_splits(counts, partner_counts, cures, n_discard)
+    return min(
+        tuple(sorted(position for color in range(N_COLORS) for position in positions_by_color[color][:split[color]]))
+        for split in splits
+    )
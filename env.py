@@ -1,27 +1,44 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
+from collections import deque
 from board import Board
 from location import City
-from player import Player
-from render import Renderer
-from dfs_top_k import GreedyAgent
+from player import Player, CURE_ATTRS
+from actions import ACTIONS, N_ACTIONS, DRIVE, DIRECT, CHARTER, TREAT, SHARE, FIND
+from beam import BeamSearchAgent
 from constants import CITIES, COLORS
-import networkx as nx
-import itertools
-import copy
-from state_eval import StateEvaluator
+from topology import DISTANCES, GRAPH, CITY_INDEX, CITY_COLORS, CARD_COLORS
+from observation import ObservationEncoder, OBS_SIZE
+from timers import (PhaseTimer, CURE_PROB, TAKE_ACTION, REWARD, DRAW_CARDS, INFECT,
+                    GOAL, DISCARD, OBSERVATION, ACTION_MASK)
+import time
+from discard import plan_discard
+from goals import plan_goal
 
 class PandemicEnv(gym.Env):
     """
     Gymnasium-compatible environment for Pandemic: Hot Zone – Europe.
+
+    The environment is headless by default. With render_mode="human" the matplotlib
+    renderer is created on the first call to render().
     """
 
-    def __init__(self):
+    metadata = {"render_modes": ["human"]}
+
+    def __init__(self, render_mode=None, timers=False):
+        """
+        Parameters:
+            render_mode (str or None): "human" to draw the map on render(), None to run headless.
+            timers (bool): Record the wall time of each phase of step() in self.timer (see enable_timers).
+        """
         super(PandemicEnv, self).__init__()
 
-        self.renderer = Renderer()
-        self.graph = self.renderer.graph
+        if render_mode is not None and render_mode not in self.metadata["render_modes"]:
+            raise ValueError(f"Invalid render mode {render_mode!r}")
+        self.render_mode = render_mode
+        self.renderer = None
+        self.graph = GRAPH
         self.win_score = []
 
         # Track the number of actions taken in a turn
@@ -29,119 +46,37 @@ class PandemicEnv(gym.Env):
         self.game_number = 0
 
         # Define action space (number of possible actions)
-        self.action_space = spaces.Discrete(79)
+        self.action_space = spaces.Discrete(N_ACTIONS)
 
         # Define observation space (game state representation)
-        self.observation_space = spaces.Box(low=0, high=1, shape=(849,), dtype=np.float32)
-
-    def set_share_location(self, current_player_hand_by_color, partner_player_hand_by_color, graph):
-        """
-        Return:
-            share_knowledge (bool) : Whether we can share cards in an advantageous location
-            share_knowledge_location (str or None) : The city name where sharing should occur
-        """
-        # Track best option for (3+1) scenario
-        best_option_1_distance = float("inf")
-        best_option_1_location = None
-        
-        # Track best option for (2 + [1..2]) scenario
-        best_option_2_distance = float("inf")
-        best_option_2_location = None
-        
-        # Giver/Receiver pairs (in both directions):
-        possible_pairs = [
-            ("current", current_player_hand_by_color, "partner", partner_player_hand_by_color),
-            ("partner", partner_player_hand_by_color, "current", current_player_hand_by_color),
-        ]
-        
-        for giver_name, giver_hand, receiver_name, receiver_hand in possible_pairs:
-            for color in ["YELLOW", "BLUE", "RED"]:
-                # Skip if cure is already discovered
-                if getattr(self.board, f"{color.lower()}_cure"):
-                    continue
-                
-                # Count how many cards of this color each player has
-                num_receiver_color = sum(1 for c in receiver_hand.values() if c == color)
-                num_giver_color = sum(1 for c in giver_hand.values() if c == color)
-
-                # Potential city cards (of this color) in the giver's hand
-                potential_locations = [
-                    city for city, card_color in giver_hand.items() if card_color == color
-                ]
-                if not potential_locations:
-                    # If giver has none of these color cards, skip
-                    continue
-
-                # We'll calculate the distance for each potential location
-                # from that city to both 'current' and 'partner' players.
-                for candidate_city in potential_locations:
-                    dist_current = nx.shortest_path_length(
-                        graph, candidate_city, self.current_player.loc.name
-                    )
-                    dist_partner = nx.shortest_path_length(
-                        graph, candidate_city, self.current_player.partner.loc.name
-                    )
-                    total_dist = dist_current + dist_partner
-
-                    # ---------------------------------------------------
-                    #  Option 1: (receiver has 3 cards, giver has >= 1)
-                    # ---------------------------------------------------
-                    if num_receiver_color == 3 and num_giver_color >= 1:
-                        if total_dist < best_option_1_distance:
-                            best_option_1_distance = total_dist
-                            best_option_1_location = candidate_city
-
-                    # ---------------------------------------------------
-                    #  Option 2: (receiver has 2, giver has 1 or 2)
-                    # ---------------------------------------------------
-                    elif num_receiver_color == 2 and num_giver_color in [1, 2]:
-                        if total_dist < best_option_2_distance:
-                            best_option_2_distance = total_dist
-                            best_option_2_location = candidate_city
-        
-        # -----------------------------------------------------------
-        # Decide which scenario to return:
-        #   - If Option 1 is available anywhere, use that.
-        #   - Otherwise, if Option 2 is available, use that.
-        #   - Otherwise, no share_knowledge is possible.
-        # -----------------------------------------------------------
-        if best_option_1_location is not None:
-            return True, best_option_1_location
-        elif best_option_2_location is not None:
-            return True, best_option_2_location
-        else:
-            return False, None
+        self.observation_space = spaces.Box(low=0, high=1, shape=(OBS_SIZE,), dtype=np.float32)
+        self.encoder = ObservationEncoder()
 
+        # Per-phase step() timers, None unless enabled.
+        self.timer = None
+        if timers:
+            self.enable_timers()
 
-    def choose_player_goal(self, current_player_hand, partner_player_hand, cities, graph):
-
-        treat_yellow_disease = False
-        treat_blue_disease = False
-        treat_red_disease = False
-        share_knowledge = False
-        share_knowledge_location = None
+    def enable_timers(self):
+        """
+        Start recording the cumulative wall time and call count of each phase of step().
 
-        current_player_hand_by_color = {city: cities[city].color for city in current_player_hand}
-        partner_player_hand_by_color = {city: cities[city].color for city in partner_player_hand}
+        The totals are read with self.timer.as_dict() or summary(), written with
+        self.timer.dump(path), and also returned in info["phase_times"] when an episode ends.
 
-        if not self.board.yellow_cure:
-            treat_yellow_disease = 1 if list(current_player_hand_by_color.values()).count("YELLOW") >= 4 else 0
-        if not self.board.blue_cure:
-            treat_blue_disease = 1 if list(current_player_hand_by_color.values()).count("BLUE") >= 4 else 0
-        if not self.board.red_cure:
-            treat_red_disease = 1 if list(current_player_hand_by_color.values()).count("RED") >= 4 else 0
+        Returns:
+            PhaseTimer: The timer.
+        """
+        if self.timer is None:
+            self.timer = PhaseTimer()
+        return self.timer
 
-        treat_disease = treat_yellow_disease or treat_blue_disease or treat_red_disease
+    def disable_timers(self):
+        """
+        Stop recording step() phase times. Disabled timers cost a None check per phase.
+        """
+        self.timer = None
 
-        if treat_disease:
-            return treat_disease, share_knowledge, share_knowledge_location
-        
-        share_knowledge, share_knowledge_location = self.set_share_location(current_player_hand_by_color, partner_player_hand_by_color, graph)
-        if share_knowledge:
-            return treat_disease, share_knowledge, share_knowledge_location
-        
-        return treat_disease, share_knowledge, share_knowledge_location
-    
     def find_cure_prob(self):
         """
         Returns the probability of finding a cure based on the player's hand.
@@ -157,11 +92,9 @@ class PandemicEnv(gym.Env):
 
         for player in self.players:
 
-            player_hand_by_color = [self.cities[card].color for card in player.hand]
-
-            yellow_prob = min(1, player_hand_by_color.count("YELLOW") / 4)
-            blue_prob = min(1, player_hand_by_color.count("BLUE") / 4)
-            red_prob = min(1, player_hand_by_color.count("RED") / 4)
+            yellow_prob = min(1, player.color_counts[0] / 4)
+            blue_prob = min(1, player.color_counts[1] / 4)
+            red_prob = min(1, player.color_counts[2] / 4)
 
             if yellow_prob > cure_prob["YELLOW"]:
                 cure_prob["YELLOW"] = yellow_prob
@@ -178,22 +111,77 @@ class PandemicEnv(gym.Env):
         """
         
         n_discard = len(player_hand) - 6
-        best_cards = None
-        best_value = float("inf")
-        
-        for cards in list(itertools.combinations(player_hand, n_discard)):
-            temp_env = copy.deepcopy(self)
-            temp_env.players[player_id-1].discard_cards(cards, temp_env.board)
+        partner = self.players[player_id-1].partner
+        hand_colors = [CARD_COLORS[card] for card in player_hand]
+        cures = (self.board.yellow_cure, self.board.blue_cure, self.board.red_cure)
 
-            evaluator = StateEvaluator(temp_env.board, temp_env.current_player,
-                        temp_env.players, temp_env.graph, temp_env.cities)
-            
-            h_value = evaluator.h_discard()
-            if h_value < best_value:
-                best_value = h_value
-                best_cards = cards
+        # Score color splits instead of applying and undoing every combination of cards.
+        positions = plan_discard(hand_colors, partner.color_counts, cures, n_discard)
+        return tuple(player_hand[position] for position in positions)
 
-        return best_cards
+    def snapshot(self):
+        """
+        Capture the mutable game state in a compact, immutable form.
+
+        The snapshot holds cubes, hands, locations, decks, discard piles, counters, cures and
+        turn state, but none of the static structures (graph, cities, renderer). It can be
+        restored any number of times with restore().
+
+        Returns:
+            tuple: The game state snapshot.
+        """
+        board = self.board
+        return (
+            tuple((city.infection_yellow, city.infection_blue, city.infection_red, city.ever_infected)
+                  for city in self.cities.values()),
+            tuple((player.loc.name, tuple(player.hand), player.previous_loc, player.goal)
+                  for player in self.players),
+            (board.epidemic_count, board.outbreak_count, board.infection_rate,
+             board.yellow_cubes, board.blue_cubes, board.red_cubes,
+             board.yellow_cure, board.blue_cure, board.red_cure),
+            (tuple(board.player_deck), tuple(board.infection_deck),
+             tuple(board.infection_discard_pile), tuple(board.player_discard_pile)),
+            (self.current_player.id, self.actions_taken, self.game_round, self.prev_outbreak_count,
+             tuple(self.high_cure_prob.items())),
+        )
+
+    def restore(self, snapshot):
+        """
+        Restore the game state captured by snapshot().
+
+        Parameters:
+            snapshot (tuple): A snapshot taken from this environment since its last reset.
+        """
+        city_state, player_state, counters, piles, turn_state = snapshot
+        board = self.board
+
+        for city, (yellow, blue, red, ever_infected) in zip(self.cities.values(), city_state):
+            city.infection_yellow = yellow
+            city.infection_blue = blue
+            city.infection_red = red
+            city.ever_infected = ever_infected
+
+        for player, (loc, hand, previous_loc, goal) in zip(self.players, player_state):
+            player.loc = self.cities[loc]
+            player.set_hand(list(hand))
+            player.previous_loc = previous_loc
+            player.goal = goal
+
+        (board.epidemic_count, board.outbreak_count, board.infection_rate,
+         board.yellow_cubes, board.blue_cubes, board.red_cubes,
+         board.yellow_cure, board.blue_cure, board.red_cure) = counters
+
+        player_deck, infection_deck, infection_discard_pile, player_discard_pile = piles
+        board.player_deck = list(player_deck)
+        board.infection_deck = deque(infection_deck)
+        board.infection_discard_pile = list(infection_discard_pile)
+        board.set_player_discard_pile(player_discard_pile)
+
+        current_player_id, self.actions_taken, self.game_round, self.prev_outbreak_count, high_cure_prob = turn_state
+        self.current_player = self.players[current_player_id - 1]
+        self.high_cure_prob = dict(high_cure_prob)
+
+        self.encoder.invalidate()
 
     def reset(self, seed=None, options=None):
         """
@@ -201,10 +189,11 @@ class PandemicEnv(gym.Env):
         """
         super().reset(seed=seed)
 
-        # Initialize the game board
-        self.board = Board()
+        # Initialize the game board. Every shuffle and random action draws from np_random,
+        # so a given seed replays the same game.
+        self.board = Board(rng=self.np_random)
         self.cities = {
-            name: City(name, self.board.pos[name], COLORS[name], CITIES[name])
+            name: City(name, self.board.pos[name], COLORS[name], CITIES[name], cubes=self.board.cubes[CITY_INDEX[name]])
             for name in CITIES.keys()
         }
         
@@ -216,7 +205,8 @@ class PandemicEnv(gym.Env):
             color="brown",
             shape="square",
             init_hand=self.board.player_1_hand,
-            partner=None
+            partner=None,
+            rng=self.np_random
         )
         self.player_2 = Player(
             id=2,
@@ -225,12 +215,13 @@ class PandemicEnv(gym.Env):
             color="green",
             shape="circle",
             init_hand=self.board.player_2_hand,
-            partner=self.player_1
+            partner=self.player_1,
+            rng=self.np_random
         )
         self.player_1.partner = self.player_2
         self.current_player = self.player_1
 
-        self.current_player.goal = self.choose_player_goal(self.current_player.hand, self.player_2.hand, self.cities, self.graph)
+        self.current_player.goal = plan_goal(self.current_player, self.player_2, self.board)
 
         self.players = [self.player_1, self.player_2]
 
@@ -245,7 +236,8 @@ class PandemicEnv(gym.Env):
         self.high_cure_prob = self.find_cure_prob()
         self.game_round = 0
 
-        return self.get_observation(), {}
+        self.encoder.invalidate()
+        return self.get_observation(), {"action_mask": self.valid_action_mask()}
 
     def step(self, action_idx):
         """
@@ -254,9 +246,175 @@ class PandemicEnv(gym.Env):
         """
     
         done = False
+        timer = self.timer
+        start = time.perf_counter() if timer is not None else None
 
         self.current_player.previous_loc = self.current_player.loc.name
         
+        self._update_high_cure_prob()
+        if timer is not None:
+            start = timer.add(CURE_PROB, start)
+
+        self.prev_outbreak_count = self.board.outbreak_count
+        prev_loc = self.current_player.loc.name
+        kind, target, color = ACTIONS[action_idx]
+        self.current_player.take_action(action_idx, self.board, self.cities)
+        if timer is not None:
+            start = timer.add(TAKE_ACTION, start)
+
+        cure_reward, share_reward, move_reward, treat_reward = self._reward_terms(kind, target, color, prev_loc)
+        reward = cure_reward + share_reward + move_reward + treat_reward
+        reward_dict = {"Cure disease": cure_reward, "Share knowledge": share_reward, "Move": move_reward}
+        if kind == TREAT:
+            reward_dict["Treat disease"] = treat_reward
+        
+        self.actions_taken += 1  # Increment action count
+        if timer is not None:
+            start = timer.add(REWARD, start)
+
+        if self.board.check_win():
+                reward = 10
+                done = True
+
+        # Only the cities the player left or entered can have changed cubes, unless the turn ends.
+        dirty_cities = (prev_loc, self.current_player.loc.name)
+
+        # If 4 actions have been taken, switch turns and draw player cards
+        if self.actions_taken == 4 and not done:
+            dirty_cities = None
+            lost, start = self._end_turn(start)
+            if lost:
+                reward = -10
+                done = True
+
+        start = self._discard_excess(start)
+
+        if done:
+            self.win_score.append(reward)
+
+        # Hand the next action mask to the caller so that wrappers need not recompute it.
+        reward_dict["action_mask"] = self.valid_action_mask()
+        if timer is not None:
+            start = timer.add(ACTION_MASK, start)
+
+        observation = self.get_observation(dirty_cities)
+        if timer is not None:
+            timer.add(OBSERVATION, start)
+            if done:
+                reward_dict["phase_times"] = timer.as_dict()
+
+        return observation, reward, done, False, reward_dict
+
+    def step_turn(self, action_indices, stop_at_invalid=False):
+        """
+        Take a sequence of actions of the current player's turn in one call, with the same effect
+        on the game as calling step() on each of them.
+
+        Each action is checked against the action mask of the state it is taken in. Only what
+        step() computes for its caller is not done for each action: the observation, the action
+        mask and the reward breakdown, and the cure probability scan after actions that leave
+        every hand as it was. If the actions end the turn, the draw and infection phase runs,
+        as in step().
+
+        Parameters:
+            action_indices (sequence): The action ids, at most as many as the actions left in
+                the turn.
+            stop_at_invalid (bool): Stop at the first action that is not allowed instead of
+                raising, e.g. for a partner's action planned before the draws and infections of
+                the previous turn. info["applied"] tells how many actions were taken.
+
+        Returns:
+            tuple: (observation, reward, done, truncated, info), as returned by step() after the
+            last action applied. reward is the sum of the rewards step() would have returned
+            for each action; info holds them under "rewards", along with the number of actions
+            applied and the action mask.
+
+        Raises:
+            ValueError: If more actions are given than are left in the turn, or, unless
+                stop_at_invalid, if an action is not allowed. The actions before it are applied.
+        """
+        actions_left = 4 - self.actions_taken
+        if len(action_indices) > actions_left:
+            raise ValueError(f"{len(action_indices)} actions given, but {actions_left} are left in the turn")
+
+        done = False
+        timer = self.timer
+        start = time.perf_counter() if timer is not None else None
+        board, cities = self.board, self.cities
+        player = self.current_player
+        rewards = []
+        dirty_cities = set()
+        hands_changed = True
+
+        for action_idx in action_indices:
+            action_mask, _ = player.action_mask(board, cities)
+            if not 0 <= action_idx < N_ACTIONS or not action_mask[action_idx]:
+                if stop_at_invalid:
+                    break
+                # The observation of the actions already taken is never built; re-encode it all.
+                self.encoder.invalidate()
+                raise ValueError(f"Action {action_idx} is not allowed for player {player.id} "
+                                 f"after {len(rewards)} of the actions given")
+
+            # The cure probabilities only depend on the hands and the cures found.
+            if hands_changed:
+                self._update_high_cure_prob()
+                if timer is not None:
+                    start = timer.add(CURE_PROB, start)
+
+            player.previous_loc = prev_loc = player.loc.name
+            self.prev_outbreak_count = board.outbreak_count
+            kind, target, color = ACTIONS[action_idx]
+            player.take_action(action_idx, board, cities)
+            if timer is not None:
+                start = timer.add(TAKE_ACTION, start)
+
+            cure_reward, share_reward, move_reward, treat_reward = self._reward_terms(kind, target, color, prev_loc)
+            rewards.append(cure_reward + share_reward + move_reward + treat_reward)
+            self.actions_taken += 1
+            hands_changed = kind != DRIVE and kind != TREAT
+            dirty_cities.add(prev_loc)
+            dirty_cities.add(player.loc.name)
+            if timer is not None:
+                start = timer.add(REWARD, start)
+
+            if board.check_win():
+                rewards[-1] = 10
+                done = True
+                break
+
+            # A shared card can take the receiver above 6 cards, which step() discards at once.
+            if kind == SHARE and self.actions_taken < 4:
+                start = self._discard_excess(start)
+
+        if rewards and self.actions_taken == 4 and not done:
+            dirty_cities = None
+            lost, start = self._end_turn(start)
+            if lost:
+                rewards[-1] = -10
+                done = True
+
+        start = self._discard_excess(start)
+
+        if done:
+            self.win_score.append(rewards[-1])
+
+        info = {"rewards": rewards, "applied": len(rewards), "action_mask": self.valid_action_mask()}
+        if timer is not None:
+            start = timer.add(ACTION_MASK, start)
+
+        observation = self.get_observation(dirty_cities)
+        if timer is not None:
+            timer.add(OBSERVATION, start)
+            if done:
+                info["phase_times"] = timer.as_dict()
+
+        return observation, sum(rewards), done, False, info
+
+    def _update_high_cure_prob(self):
+        """
+        Raise the highest cure probabilities of the game to the current ones where they are higher.
+        """
         cure_prob = self.find_cure_prob()
         if cure_prob["YELLOW"] > self.high_cure_prob["YELLOW"]:
             self.high_cure_prob["YELLOW"] = cure_prob["YELLOW"]
@@ -265,114 +423,133 @@ class PandemicEnv(gym.Env):
         if cure_prob["RED"] > self.high_cure_prob["RED"]:
             self.high_cure_prob["RED"] = cure_prob["RED"]
 
-        self.prev_outbreak_count = self.board.outbreak_count
-        prev_loc = self.current_player.loc.name
-        action = self.current_player.all_actions[action_idx]
-        self.current_player.take_action(action, self.board, self.cities)
-
-        token = action.split()
-        # current_player_hand_by_color = [self.cities[card].color for card in self.current_player.hand]
+    def _reward_terms(self, kind, target, color, prev_loc):
+        """
+        Return the shaped reward of the action the current player just took, by component.
 
-        # 0: Minimize infection spread
+        Parameters:
+            kind, target, color: The action, as decoded in ACTIONS.
+            prev_loc (str): The name of the city the action was taken from.
 
-        reward_dict = {}
-        reward_dict["Cure disease"] = 0
-        reward_dict["Share knowledge"] = 0
-        reward_dict["Move"] = 0
-        reward = 0
+        Returns:
+            tuple: The (cure disease, share knowledge, move, treat disease) rewards. Their sum,
+            left to right, is the reward of the action.
+        """
+        loc = self.current_player.loc
+        cure_reward = share_reward = move_reward = treat_reward = 0
 
         find_cure, share_knowledge, share_knowledge_location = self.current_player.goal
 
+        # A: Move towards the research station, or to where cards can be shared
         if find_cure:
-            reward += 0.1 * (nx.shortest_path_length(self.graph, prev_loc, "GENÈVE") - \
-            nx.shortest_path_length(self.graph, self.current_player.loc.name, "GENÈVE"))
-            reward_dict["Cure disease"] += 0.1 * (nx.shortest_path_length(self.graph, prev_loc, "GENÈVE") - \
-            nx.shortest_path_length(self.graph, self.current_player.loc.name, "GENÈVE"))
+            cure_reward += 0.1 * (DISTANCES[prev_loc]["GENÈVE"] - DISTANCES[loc.name]["GENÈVE"])
 
-        if token[0] == "FIND":
-            reward += 3
-            reward_dict["Cure disease"] += 3
+        if kind == FIND:
+            cure_reward += 3
 
         if share_knowledge:
-            reward += 0.1 * (nx.shortest_path_length(self.graph, prev_loc, share_knowledge_location) - \
-            nx.shortest_path_length(self.graph, self.current_player.loc.name, share_knowledge_location))
-            reward_dict["Cure disease"] += 0.1 * (nx.shortest_path_length(self.graph, prev_loc, share_knowledge_location) - \
-            nx.shortest_path_length(self.graph, self.current_player.loc.name, share_knowledge_location))
+            cure_reward += 0.1 * (DISTANCES[prev_loc][share_knowledge_location] - \
+            DISTANCES[loc.name][share_knowledge_location])
 
-        if token[0] == "SHARE":
-            if self.find_cure_prob()[self.current_player.loc.color] > self.high_cure_prob[self.current_player.loc.color]:
-                reward += 1
-                reward_dict["Share knowledge"] += 1
+        # B: Share knowledge that raises the chance of a cure
+        if kind == SHARE:
+            if self.find_cure_prob()[loc.color] > self.high_cure_prob[loc.color]:
+                share_reward = 1
 
-        if token[0] == "DIRECT" and not getattr(self.board, f"{COLORS[token[-1]].lower()}_cure"):
-            reward += -0.1
-            reward_dict["Move"] += -0.1
+        # Flights spend a card that an uncured disease may need
+        if kind == DIRECT and not getattr(self.board, CURE_ATTRS[CITY_COLORS[target]]):
+            move_reward = -0.1
 
-        if token[0] == "CHARTER" and not getattr(self.board, f"{COLORS[prev_loc].lower()}_cure"):
-            reward += -0.1
-            reward_dict["Move"] += -0.1
+        if kind == CHARTER and not getattr(self.board, CURE_ATTRS[CITY_COLORS[CITY_INDEX[prev_loc]]]):
+            move_reward = -0.1
 
         # C: Treat a disease
-        if token[0] == "TREAT": 
-            if getattr(self.current_player.loc, f"infection_{token[-1].lower()}") == 2:
-                reward += 0.3
-                reward_dict["Treat disease"] = 0.3
-            elif getattr(self.current_player.loc, f"infection_{token[-1].lower()}") == 1:
-                reward += 0.1
-                reward_dict["Treat disease"] = 0.1
-            elif getattr(self.current_player.loc, f"infection_{token[-1].lower()}") == 0:
-                reward += 0.1
-                reward_dict["Treat disease"] = 0.1
-        
-        self.actions_taken += 1  # Increment action count
+        if kind == TREAT:
+            remaining = loc.cubes[color]
+            if remaining == 2:
+                treat_reward = 0.3
+            elif remaining == 1 or remaining == 0:
+                treat_reward = 0.1
 
-        if self.board.check_win():
-                reward = 10
-                done = True
+        return cure_reward, share_reward, move_reward, treat_reward
 
-        # If 4 actions have been taken, switch turns and draw player cards
-        if self.actions_taken == 4 and not done:
-            # Check win/loss conditions
-            if self.board.check_loss_player_deck():
-                reward = -10
-                done = True
-            else:
-                self.actions_taken = 0  # Reset action counter
-                self.board.draw_player_deck(self.current_player, self.cities)
-                # After drawing two cards, draw from the epidemic deck as per the current infection rate.
-                self.board.draw_epidemic_deck(self.cities, n_draws=self.board.infection_rate_track[self.board.infection_rate], 
-                                              n_cubes=1, quarantine_specialist_loc=self.player_2.loc.name)
-                self.game_round += 1
-
-            if self.board.check_loss_infection():
-                reward = -10
-                done = True
+    def _end_turn(self, start=None):
+        """
+        End the current player's turn: draw player cards, infect cities and pass the turn to the
+        partner, with a new goal.
 
-            # Switch player turns
-            self.current_player = self.player_2 if self.current_player == self.player_1 else self.player_1
-            self.current_player.goal = self.choose_player_goal(self.current_player.hand, self.current_player.partner.hand, self.cities, self.graph)
+        Parameters:
+            start (float or None): The timestamp of the phase timers, when they are enabled.
 
-        # Discard cards if player has more than 6
+        Returns:
+            tuple: Whether the game was lost, and the timestamp after the phases timed.
+        """
+        timer = self.timer
+        lost = False
+        # Check win/loss conditions
+        if self.board.check_loss_player_deck():
+            lost = True
+        else:
+            self.actions_taken = 0  # Reset action counter
+            self.board.draw_player_deck(self.current_player, self.cities)
+            if timer is not None:
+                start = timer.add(DRAW_CARDS, start)
+            # After drawing two cards, draw from the epidemic deck as per the current infection rate.
+            self.board.draw_epidemic_deck(self.cities, n_draws=self.board.infection_rate_track[self.board.infection_rate], 
+                                          n_cubes=1, quarantine_specialist_loc=self.player_2.loc.name)
+            if timer is not None:
+                start = timer.add(INFECT, start)
+            self.game_round += 1
+
+        if self.board.check_loss_infection():
+            lost = True
+
+        # Switch player turns
+        self.current_player = self.player_2 if self.current_player == self.player_1 else self.player_1
+        self.current_player.goal = plan_goal(self.current_player, self.current_player.partner, self.board)
+        if timer is not None:
+            start = timer.add(GOAL, start)
+        return lost, start
+
+    def _discard_excess(self, start=None):
+        """
+        Discard cards from every hand above 6 cards.
+
+        Parameters:
+            start (float or None): The timestamp of the phase timers, when they are enabled.
+
+        Returns:
+            float or None: The timestamp after the discards timed.
+        """
+        timer = self.timer
         for player in self.players:
             if len(player.hand) > 6:
                 discard = self.select_discard(player.id, player.hand)
                 player.discard_cards(discard, self.board)
-
-        if done:
-            self.win_score.append(reward)
-
-        return self.get_observation(), reward, done, False, reward_dict
+                if timer is not None:
+                    start = timer.add(DISCARD, start)
+        return start
     
     def valid_action_mask(self):
+        """
+        Return a copy of the current player's boolean action mask.
+        """
         action_mask, _ = self.current_player.action_mask(self.board, self.cities)
-        assert len(action_mask) == 79
-        return np.array(action_mask)
+        return action_mask.copy()
     
-    def render(self, mode="human"):
+    def render(self):
         """
         Render the current state of the game after each action.
         """
-        
+        if self.render_mode is None:
+            gym.logger.warn("Calling render() on a headless PandemicEnv; pass render_mode=\"human\" to enable it.")
+            return
+
+        if self.renderer is None:
+            # Import lazily so headless environments never load matplotlib.
+            from render import Renderer
+            self.renderer = Renderer()
+
         self.renderer.draw_map(
             self.cities,
             self.player_1,
@@ -391,6 +568,14 @@ class PandemicEnv(gym.Env):
             self.game_number
         )
 
+    def close(self):
+        """
+        Close the renderer window, if one was opened.
+        """
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+
     def decode_obs(self, obs):
         """
         Decodes the observation vector into a dictionary representation.
@@ -411,72 +596,26 @@ class PandemicEnv(gym.Env):
         decoded_obs["Find cure"] = round(float(obs[848]), 1)
         return decoded_obs
 
-    def get_observation(self):
+    def get_observation(self, dirty_cities=None):
         """
         Returns a vector representation of the game state.
-        """
-        obs = {}
-        find_cure, share_knowledge, share_knowledge_location = self.current_player.goal
 
-        for city in self.cities.values():
-            partial_obs = []
-            if share_knowledge and share_knowledge_location == city.name:
-                partial_obs.append(1)
-            else:
-                partial_obs.append(0)
-            partial_obs.append(city.color_encoder / 2)
-            partial_obs.append(city.infection_yellow / 3)
-            partial_obs.append(city.infection_blue / 3)
-            partial_obs.append(city.infection_red / 3)
-            partial_obs.append(1 if city.name in self.player_1.hand else 0)
-            partial_obs.append(1 if city.name == self.player_1.loc.name else 0)
-            partial_obs.append(1 if city.name in self.player_2.hand else 0)
-            partial_obs.append(1 if city.name == self.player_2.loc.name else 0)
-            partial_obs.append(1 if city.name in self.board.infection_discard_pile else 0)
-            partial_obs.append(1 if city.name in self.board.player_discard_pile else 0)
-        
-            for other_city in self.cities.values():
-                if city.name == other_city.name:
-                    partial_obs.append(0)
-                else:
-                    partial_obs.append(nx.shortest_path_length(self.graph, city.name, other_city.name) / 8)
-            
-            obs[city.name] = partial_obs
-
-        obs["Game round"] = self.game_round / 10
-        obs["Player id"] = self.current_player.id - 1
-        obs["Player turn"] = self.actions_taken / 4
-        obs["Outbreak count"] = self.board.outbreak_count / 4
-        obs["Infection rate"] = self.board.infection_rate / 3
-        obs["Yellow cure"] = self.board.yellow_cure
-        obs["Blue cure"] = self.board.blue_cure
-        obs["Red cure"] = self.board.red_cure
-        obs["Find cure"] = (1 if find_cure else 0)
-
-        obs_data = []
-        for _, value in obs.items():
-            if isinstance(value, list):
-                obs_data.extend(value)
-            else:
-                obs_data.append(value)
-
-        obs_data = np.array(obs_data, dtype=np.float32)
-
-        # print(obs_data)
-
-        # Encode player locations
-        return obs_data
+        Parameters:
+            dirty_cities (iterable or None): Names of the only cities whose cubes may have changed
+                since the previous observation. If None, every city is re-encoded.
+        """
+        return self.encoder.encode(self, dirty_cities)
 
 def main():
 
     # Initialize the environment
-    env = PandemicEnv()
+    env = PandemicEnv(render_mode="human")
 
-    # Initialize the greedy agent
-    greedy_agent = GreedyAgent(env)
+    # Initialize the beam search agent
+    agent = BeamSearchAgent(env)
 
-    # Run the greedy agent for 50 episodes
-    greedy_agent.play(episodes=100)
+    # Run the agent for 100 episodes
+    agent.play(episodes=100)
 
     print(f"Win rate: {env.win_score.count(1)*100 / len(env.win_score)}%")
     env.close()
@@ -0,0 +1,193 @@
+"""
+Goal planning for the players, shared by the environment and the search agents.
+
+A player's goal is what the heuristics steer towards for a turn: finding a cure with the
+cards in hand, or meeting the partner in a city to share the card missing for one. It
+depends only on both players' hands, both players' locations and the cures found, and it is
+chosen on every reset, every turn switch and before every search, often for states seen
+before. plan_goal() memoizes choose_player_goal() on those inputs.
+"""
+from player import CURE_ATTRS
+from topology import DISTANCES, CARD_COLORS
+from transposition import TranspositionTable
+
+DEFAULT_GOAL_CACHE_SIZE = 50_000    # Goals kept by a GoalPlanner before evicting.
+
+
+def set_share_location(current_player, partner_player, board):
+    """
+    Parameters:
+        current_player (Player): The player whose turn it is.
+        partner_player (Player): The other player.
+        board (Board): The game board, read for the cures found.
+
+    Return:
+        share_knowledge (bool) : Whether we can share cards in an advantageous location
+        share_knowledge_location (str or None) : The city name where sharing should occur
+    """
+    # Track best option for (3+1) scenario
+    best_option_1_distance = float("inf")
+    best_option_1_location = None
+
+    # Track best option for (2 + [1..2]) scenario
+    best_option_2_distance = float("inf")
+    best_option_2_location = None
+
+    # Giver/Receiver pairs (in both directions):
+    possible_pairs = [
+        (current_player, partner_player),
+        (partner_player, current_player),
+    ]
+
+    for giver, receiver in possible_pairs:
+        for color in range(len(CURE_ATTRS)):
+            # Skip if cure is already discovered
+            if getattr(board, CURE_ATTRS[color]):
+                continue
+
+            # Count how many cards of this color each player has
+            num_receiver_color = receiver.color_counts[color]
+            num_giver_color = giver.color_counts[color]
+            if not num_giver_color:
+                # If giver has none of these color cards, skip
+                continue
+
+            # We'll calculate the distance for each potential location (city card
+            # of this color in the giver's hand) to both 'current' and 'partner' players.
+            for candidate_city in giver.hand:
+                if CARD_COLORS[candidate_city] != color:
+                    continue
+                dist_current = DISTANCES[candidate_city][current_player.loc.name]
+                dist_partner = DISTANCES[candidate_city][partner_player.loc.name]
+                total_dist = dist_current + dist_partner
+
+                # ---------------------------------------------------
+                #  Option 1: (receiver has 3 cards, giver has >= 1)
+                # ---------------------------------------------------
+                if num_receiver_color == 3 and num_giver_color >= 1:
+                    if total_dist < best_option_1_distance:
+                        best_option_1_distance = total_dist
+                        best_option_1_location = candidate_city
+
+                # ---------------------------------------------------
+                #  Option 2: (receiver has 2, giver has 1 or 2)
+                # ---------------------------------------------------
+                elif num_receiver_color == 2 and num_giver_color in [1, 2]:
+                    if total_dist < best_option_2_distance:
+                        best_option_2_distance = total_dist
+                        best_option_2_location = candidate_city
+
+    # -----------------------------------------------------------
+    # Decide which scenario to return:
+    #   - If Option 1 is available anywhere, use that.
+    #   - Otherwise, if Option 2 is available, use that.
+    #   - Otherwise, no share_knowledge is possible.
+    # -----------------------------------------------------------
+    if best_option_1_location is not None:
+        return True, best_option_1_location
+    elif best_option_2_location is not None:
+        return True, best_option_2_location
+    else:
+        return False, None
+
+
+def choose_player_goal(current_player, partner_player, board):
+    """
+    Choose the goal of the player whose turn it is.
+
+    Parameters:
+        current_player (Player): The player whose turn it is.
+        partner_player (Player): The other player.
+        board (Board): The game board, read for the cures found.
+
+    Returns:
+        tuple: (treat_disease, share_knowledge, share_knowledge_location).
+    """
+    treat_yellow_disease = False
+    treat_blue_disease = False
+    treat_red_disease = False
+    share_knowledge = False
+    share_knowledge_location = None
+
+    current_player_color_counts = current_player.color_counts
+
+    if not board.yellow_cure:
+        treat_yellow_disease = 1 if current_player_color_counts[0] >= 4 else 0
+    if not board.blue_cure:
+        treat_blue_disease = 1 if current_player_color_counts[1] >= 4 else 0
+    if not board.red_cure:
+        treat_red_disease = 1 if current_player_color_counts[2] >= 4 else 0
+
+    treat_disease = treat_yellow_disease or treat_blue_disease or treat_red_disease
+
+    if treat_disease:
+        return treat_disease, share_knowledge, share_knowledge_location
+
+    share_knowledge, share_knowledge_location = set_share_location(current_player, partner_player, board)
+    return treat_disease, share_knowledge, share_knowledge_location
+
+
+class GoalPlanner:
+    """
+    choose_player_goal() behind a bounded cache, evicting the least recently used goal when full.
+
+    Goals are cached under goal_key(). Hits and misses are counted by the cache, a
+    TranspositionTable.
+    """
+
+    def __init__(self, capacity=DEFAULT_GOAL_CACHE_SIZE):
+        """
+        Parameters:
+            capacity (int): The maximum number of goals kept. 0 disables the cache.
+        """
+        self.cache = TranspositionTable(capacity)
+
+    @staticmethod
+    def goal_key(current_player, partner_player, board):
+        """
+        Return the key of everything choose_player_goal() reads.
+
+        The hands are kept in order rather than as sets: when two share locations are equally
+        close, the card that comes first in the giver's hand is chosen. The cures found are
+        packed into one int.
+        """
+        cures = board.yellow_cure | board.blue_cure << 1 | board.red_cure << 2
+        return (cures, current_player.loc.name, partner_player.loc.name,
+                tuple(current_player.hand), tuple(partner_player.hand))
+
+    def plan(self, current_player, partner_player, board):
+        """
+        Return choose_player_goal(current_player, partner_player, board), from the cache if the
+        same hands, locations and cures were planned for before.
+        """
+        key = self.goal_key(current_player, partner_player, board)
+        goal = self.cache.get(key)
+        if goal is None:
+            goal = choose_player_goal(current_player, partner_player, board)
+            self.cache.put(key, goal)
+        return goal
+
+    def stats(self):
+        """
+        Return the cache counters as a dict.
+        """
+        return self.cache.stats()
+
+
+# The planner of this process, shared by every environment and agent in it.
+GOAL_PLANNER = GoalPlanner()
+
+
+def plan_goal(current_player, partner_player, board):
+    """
+    Choose the goal of the player whose turn it is, memoized by the process-wide GOAL_PLANNER.
+
+    Parameters:
+        current_player (Player): The player whose turn it is.
+        partner_player (Player): The other player.
+        board (Board): The game board, read for the cures found.
+
+    Returns:
+        tuple: (treat_disease, share_knowledge, share_knowledge_location).
+    """
+    return GOAL_PLANNER.plan(current_player, partner_player, board)
@@ -1,187 +1,256 @@
-import copy
-from state_eval import StateEvaluator
-import networkx as nx
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from state_eval import IncrementalEvaluator
+from goals import plan_goal
+from transposition import ZobristHasher, TranspositionTable, DEFAULT_TT_SIZE
+from pruning import MovePruner
 
-class GreedyAgent:
+ORDERING_DEPTH = 4     # Actions left from which children are searched best-first.
+
+
+class _BudgetExhausted(Exception):
     """
-    A greedy agent that picks the action with the lowest heuristic value.
+    Raised inside the search when the time or node budget of a decision runs out.
     """
 
-    def __init__(self, env):
-        self.env = env
 
+# The agent searching in a root-parallel worker process, with its own game and table.
+_worker_agent = None
 
-    import networkx as nx
-
-    def set_share_location(self, current_player_hand_by_color, partner_player_hand_by_color, graph):
-        """
-        Return:
-            share_knowledge (bool) : Whether we can share cards in an advantageous location
-            share_knowledge_location (str or None) : The city name where sharing should occur
-        """
-        # Track best option for (3+1) scenario
-        best_option_1_distance = float("inf")
-        best_option_1_location = None
-        
-        # Track best option for (2 + [1..2]) scenario
-        best_option_2_distance = float("inf")
-        best_option_2_location = None
-        
-        # Giver/Receiver pairs (in both directions):
-        possible_pairs = [
-            ("current", current_player_hand_by_color, "partner", partner_player_hand_by_color),
-            ("partner", partner_player_hand_by_color, "current", current_player_hand_by_color),
-        ]
-        
-        for giver_name, giver_hand, receiver_name, receiver_hand in possible_pairs:
-            for color in ["YELLOW", "BLUE", "RED"]:
-                # Skip if cure is already discovered
-                if getattr(self.env.board, f"{color.lower()}_cure"):
-                    continue
-                
-                # Count how many cards of this color each player has
-                num_receiver_color = sum(1 for c in receiver_hand.values() if c == color)
-                num_giver_color = sum(1 for c in giver_hand.values() if c == color)
-
-                # Potential city cards (of this color) in the giver's hand
-                potential_locations = [
-                    city for city, card_color in giver_hand.items() if card_color == color
-                ]
-                if not potential_locations:
-                    # If giver has none of these color cards, skip
-                    continue
-
-                # We'll calculate the distance for each potential location
-                # from that city to both 'current' and 'partner' players.
-                for candidate_city in potential_locations:
-                    dist_current = nx.shortest_path_length(
-                        graph, candidate_city, self.env.current_player.loc.name
-                    )
-                    dist_partner = nx.shortest_path_length(
-                        graph, candidate_city, self.env.current_player.partner.loc.name
-                    )
-                    total_dist = dist_current + dist_partner
-
-                    # ---------------------------------------------------
-                    #  Option 1: (receiver has 3 cards, giver has >= 1)
-                    # ---------------------------------------------------
-                    if num_receiver_color == 3 and num_giver_color >= 1:
-                        if total_dist < best_option_1_distance:
-                            best_option_1_distance = total_dist
-                            best_option_1_location = candidate_city
-
-                    # ---------------------------------------------------
-                    #  Option 2: (receiver has 2, giver has 1 or 2)
-                    # ---------------------------------------------------
-                    elif num_receiver_color == 2 and num_giver_color in [1, 2]:
-                        if total_dist < best_option_2_distance:
-                            best_option_2_distance = total_dist
-                            best_option_2_location = candidate_city
-        
-        # -----------------------------------------------------------
-        # Decide which scenario to return:
-        #   - If Option 1 is available anywhere, use that.
-        #   - Otherwise, if Option 2 is available, use that.
-        #   - Otherwise, no share_knowledge is possible.
-        # -----------------------------------------------------------
-        if best_option_1_location is not None:
-            return True, best_option_1_location
-        elif best_option_2_location is not None:
-            return True, best_option_2_location
-        else:
-            return False, None
 
+def _init_worker(tt_size, prune, prune_dominated, branch_and_bound):
+    """
+    Create the game and the agent of a root-parallel worker process.
+    """
+    global _worker_agent
+    # Imported here: env.py imports the agents, and only the workers need a game of their own.
+    from env import PandemicEnv
 
-    def choose_player_goal(self, current_player_hand, partner_player_hand, cities, graph):
+    env = PandemicEnv()
+    env.reset(seed=0)
+    _worker_agent = GreedyAgent(env, tt_size=tt_size, prune=prune, prune_dominated=prune_dominated,
+                                branch_and_bound=branch_and_bound)
 
-        treat_yellow_disease = False
-        treat_blue_disease = False
-        treat_red_disease = False
-        share_knowledge = False
-        share_knowledge_location = None
 
-        current_player_hand_by_color = {city: cities[city].color for city in current_player_hand}
-        partner_player_hand_by_color = {city: cities[city].color for city in partner_player_hand}
+def _search_root_action(snapshot, goal, action, limit):
+    """
+    Search the subtree below one first-ply action in a worker process.
+
+    Parameters:
+        snapshot (tuple): The root state, from PandemicEnv.snapshot().
+        goal (tuple): The goal chosen at the root.
+        action (int): The first action of the sequences searched.
+        limit (float): Only sequences with a lower value than this are looked for, as in the
+            serial search.
+
+    Returns:
+        tuple: The best value below the action and the best sequence (starting with the
+        action), or the limit and None if no sequence is below it; then the number of nodes
+        expanded and of states cut off by branch and bound.
+    """
+    agent = _worker_agent
+    env = agent.env
+    env.restore(snapshot)
+    nodes, cutoffs = agent.nodes, agent.cutoffs
 
-        if not self.env.board.yellow_cure:
-            treat_yellow_disease = 1 if list(current_player_hand_by_color.values()).count("YELLOW") >= 4 else 0
-        if not self.env.board.blue_cure:
-            treat_blue_disease = 1 if list(current_player_hand_by_color.values()).count("BLUE") >= 4 else 0
-        if not self.env.board.red_cure:
-            treat_red_disease = 1 if list(current_player_hand_by_color.values()).count("RED") >= 4 else 0
+    state_hash = agent.hasher.hash_state(env) ^ agent.hasher.goal_key(goal)
+    agent.evaluator.reset()
+    player = env.current_player
+    record = player.take_action(action, env.board, env.cities)
+    agent.evaluator.apply(player, record)
+    child_hash = agent.hasher.update(state_hash, player, record, env.board)
+    value, sequence = agent._dfs_4_level(env, 1, (action,), goal, limit, None, child_hash, record)
+    agent.evaluator.undo()
+    player.undo_action(record, env.board, env.cities)
 
-        treat_disease = treat_yellow_disease or treat_blue_disease or treat_red_disease
+    return value, sequence, agent.nodes - nodes, agent.cutoffs - cutoffs
+
+
+class GreedyAgent:
+    """
+    A greedy agent that picks the action with the lowest heuristic value.
+    """
+
+    def __init__(self, env, tt_size=DEFAULT_TT_SIZE, n_workers=1, time_budget=None, node_budget=None,
+                 prune=True, prune_dominated=False, branch_and_bound=True):
+        """
+        Parameters:
+            env (PandemicEnv): The game to play.
+            tt_size (int): Entries kept by the transposition table. 0 disables it.
+            n_workers (int or None): Worker processes the first-ply actions are split across.
+                1 searches serially in this process; None uses one per core.
+            time_budget (float or None): Seconds allowed per decision.
+            node_budget (int or None): Nodes allowed per decision. If either budget is set,
+                decisions use iterative_deepening() instead of the fixed-depth search.
+            prune (bool): Skip reorderings of commuting actions and moves on from equivalent
+                stopovers, which does not change the decisions (see pruning.py).
+            prune_dominated (bool): Also skip driving straight back to the previous city. This
+                can change the decisions.
+            branch_and_bound (bool): Skip states whose lower bound shows they cannot beat the
+                best sequence found so far. The decisions are the same.
+        """
+        self.env = env
+        self.nodes = 0      # Search nodes expanded so far, for benchmarking.
+        self.hasher = ZobristHasher()
+        self.tt = TranspositionTable(tt_size)   # (hash, depth, hands) -> (value, actions)
+        self.evaluator = IncrementalEvaluator(env)  # Follows the search's actions; reset at each root.
+        self.tt_size = tt_size
+        self.n_workers = (os.cpu_count() or 1) if n_workers is None else n_workers
+        self._pool = None   # Started on the first parallel search.
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.horizon = 4    # Depth at which states are evaluated.
+        self.prune = prune
+        self.prune_dominated = prune_dominated
+        self.pruner = MovePruner(prune_dominated)
+        self.branch_and_bound = branch_and_bound
+        self.cutoffs = 0    # States skipped by branch and bound.
+
+        # Budget of the running iterative deepening search, checked at every node when set.
+        self._limited = False
+        self._deadline = float('inf')
+        self._node_limit = float('inf')
 
-        if treat_disease:
-            return treat_disease, share_knowledge, share_knowledge_location
-        
-        share_knowledge, share_knowledge_location = self.set_share_location(current_player_hand_by_color, partner_player_hand_by_color, graph)
-        if share_knowledge:
-            return treat_disease, share_knowledge, share_knowledge_location
-        
-        return treat_disease, share_knowledge, share_knowledge_location
 
     def _evaluate_state(self, env, goal):
         """
         Evaluate the given state's heuristic with respect to a *fixed* goal.
+        The evaluator's running sums follow the actions of the search, so this gives
+        h_state(goal) without scanning the whole map.
         """
-        # Use your existing StateEvaluator
-        evaluator = StateEvaluator(
-            env.board, 
-            env.current_player, 
-            [env.player_1, env.player_2], 
-            env.graph, 
-            env.cities
-        )
-        return evaluator.h_state(goal)
+        return self.evaluator.evaluate(goal)
 
-    def _dfs_4_level(self, env, depth, action_sequence, goal, best_value, best_sequence):
+    def _dfs_4_level(self, env, depth, action_sequence, goal, best_value, best_sequence, state_hash,
+                     record=None):
         """
         Depth-limited DFS that explores up to 4 actions. 
         Returns an updated (best_value, best_sequence).
+
+        The best value and actions below a state are looked up in the transposition table before
+        searching it. Entries are keyed by the state hash, the depth and the order of both hands:
+        the hand order decides the order actions are tried in, and so which of several equally
+        good sequences is found first. The depth is counted from the horizon, so that iterative
+        deepening reuses the subtrees searched by earlier iterations.
+
+        record is the undo record of the action leading to the state, which decides what is
+        pruned below it. A pruned search only finds the best of the sequences not searched
+        elsewhere, so its result is not stored. A stored, complete result can stand in for a
+        pruned search: it only adds sequences that are equivalent to ones searched elsewhere,
+        which leaves the choice unchanged.
+
+        With branch and bound, a state is not searched when the evaluator's lower bound shows
+        it cannot beat best_value, and its search looks only for sequences below best_value. A
+        search that finds none stores best_value with no actions: a bound that rules the state
+        out for any later search with a best value at or below it.
         """
-        # If we've reached 4 actions, evaluate the final state.
-        if depth == 4:
-            h_value = self._evaluate_state(env, goal)
-            if h_value < best_value:
-                return h_value, action_sequence
-            else:
+        key = (state_hash, self.horizon - depth, tuple(env.player_1.hand), tuple(env.player_2.hand))
+        entry = self.tt.get(key)
+        if entry is not None and entry[1] is None and entry[0] < best_value:
+            entry = None    # A bound too low to rule the state out.
+        if entry is None:
+            actions_left = self.horizon - depth
+            if (self.branch_and_bound and actions_left and
+                    self.evaluator.lower_bound(goal, env.current_player, actions_left) >= best_value):
+                self.cutoffs += 1
                 return best_value, best_sequence
 
+            context = None
+            if self.prune and record is not None and actions_left:
+                context = self.pruner.context(env.current_player, record, env.cities)
+            value, suffix, pruned = self._search(env, depth, goal, state_hash, context, best_value)
+            entry = value, suffix
+            if not pruned:
+                self.tt.put(key, entry)
+
+        value, suffix = entry
+        if suffix is not None and value < best_value:
+            return value, action_sequence + suffix
+        else:
+            return best_value, best_sequence
+
+    def _search(self, env, depth, goal, state_hash, context=None, limit=float('inf')):
+        """
+        Search the state below a node, independently of the rest of the tree.
+
+        Parameters:
+            limit (float): Only sequences with a lower value than this are looked for.
+
+        Returns:
+            tuple: The best heuristic value reachable, the actions (a tuple) reaching it and
+            whether any actions were pruned. If no sequence is below the limit, the limit and
+            None instead of the actions.
+        """
+        if self._limited and (self.nodes >= self._node_limit or time.perf_counter() >= self._deadline):
+            raise _BudgetExhausted
+
+        self.nodes += 1
+        # If we've reached 4 actions (or the horizon of this iteration), evaluate the final state.
+        if depth == self.horizon:
+            return self._evaluate_state(env, goal), (), False
+
         # Find which actions are valid in the current state
         _, allowed_actions = env.current_player.action_mask(env.board, env.cities)
 
         # If no actions are allowed, evaluate now (terminal)
         if not allowed_actions:
-            h_value = self._evaluate_state(env, goal)
-            if h_value < best_value:
-                return h_value, action_sequence
-            else:
-                return best_value, best_sequence
-
-        # Explore each allowed action
-        for action in allowed_actions:
-            # Copy the environment so as not to disturb the real one
-            temp_env = copy.deepcopy(env)
+            return self._evaluate_state(env, goal), (), False
+
+        # Explore each allowed action in place, undoing it afterwards
+        best_value, best_sequence, best_position = limit, None, -1
+        player = env.current_player
+        # Actions whose sequences are searched in another order or by another route
+        skip = self.pruner.skipped(context, allowed_actions) if context is not None else ()
+        for position, action in self._ordered_actions(env, depth, goal, allowed_actions, skip):
             # Apply the action
-            temp_env.current_player.take_action(action, temp_env.board, temp_env.cities)
-
-            # Recurse
-            new_value, new_sequence = self._dfs_4_level(
-                temp_env, 
+            record = player.take_action(action, env.board, env.cities)
+            self.evaluator.apply(player, record)
+            child_hash = self.hasher.update(state_hash, player, record, env.board)
+
+            # Recurse. As in the unordered search, an equal value replaces the best so far if its
+            # action comes first in the allowed actions.
+            child_limit = math.nextafter(best_value, math.inf) if position < best_position else best_value
+            value, sequence = self._dfs_4_level(
+                env, 
                 depth + 1, 
-                action_sequence + [action], 
+                (action,), 
                 goal,
-                best_value,
-                best_sequence
+                child_limit,
+                None,
+                child_hash,
+                record
             )
+            if sequence is not None:
+                best_value, best_sequence, best_position = value, sequence, position
+            self.evaluator.undo()
+            player.undo_action(record, env.board, env.cities)
 
-            # Update the best if the new one is better
-            if new_value < best_value:
-                best_value = new_value
-                best_sequence = new_sequence
+        return best_value, best_sequence, bool(skip)
 
-        return best_value, best_sequence
+    def _ordered_actions(self, env, depth, goal, allowed_actions, skip):
+        """
+        Return the (position, action) pairs of the actions to search, in the order to search them.
+
+        With ORDERING_DEPTH or more actions left (at the root of a full search), the actions are
+        ordered by the value of the state they lead to, so that branch and bound finds a good
+        sequence early. Deeper, they are searched in the order allowed, which measured faster.
+        """
+        actions = [(position, action) for position, action in enumerate(allowed_actions) if action not in skip]
+        if self.horizon - depth < ORDERING_DEPTH or not self.branch_and_bound:
+            return actions
+
+        player = env.current_player
+        scores = {}
+        for position, action in actions:
+            record = player.take_action(action, env.board, env.cities)
+            self.evaluator.apply(player, record)
+            scores[position] = self.evaluator.evaluate(goal)
+            self.evaluator.undo()
+            player.undo_action(record, env.board, env.cities)
+        actions.sort(key=lambda pair: (scores[pair[0]], pair[0]))
+        return actions
 
     def select_best_4step_sequence(self):
         """
@@ -189,26 +258,190 @@ class GreedyAgent:
         based on the final state's heuristic value w.r.t. a fixed goal.
         """
         # Compute the goal once
-        goal = self.choose_player_goal(
-            self.env.current_player.hand,
-            self.env.current_player.partner.hand,
-            self.env.cities, 
-            self.env.graph
-        )
+        goal = plan_goal(self.env.current_player, self.env.current_player.partner, self.env.board)
+        if self.time_budget is not None or self.node_budget is not None:
+            return self.iterative_deepening(self.time_budget, self.node_budget, goal=goal)
+        if self.n_workers > 1:
+            return list(self._parallel_root_search(goal))
+        state_hash = self.hasher.hash_state(self.env) ^ self.hasher.goal_key(goal)
+        self.evaluator.reset()
 
         # Start the DFS at depth=0, with an empty sequence, 
         # and best initialized to infinity
         best_value, best_sequence = self._dfs_4_level(
             env=self.env,
             depth=0,
-            action_sequence=[],
+            action_sequence=(),
             goal=goal,
             best_value=float('inf'),
-            best_sequence=[]
+            best_sequence=(),
+            state_hash=state_hash
         )
 
+        return list(best_sequence)
+
+    def iterative_deepening(self, time_budget=None, node_budget=None, max_depth=4, goal=None):
+        """
+        Search sequences of 1, 2, ... max_depth actions until the budget runs out.
+
+        Each iteration searches the first-ply actions best-first by their value in the previous
+        iteration, so the previous best sequence is searched again first. When the budget runs
+        out, the interrupted iteration's best is kept if that sequence was searched again, and the
+        previous iteration's best otherwise. The first iteration always completes. A search that
+        completes max_depth picks the same sequence as the fixed-depth search.
+
+        Parameters:
+            time_budget (float or None): Seconds allowed for the decision.
+            node_budget (int or None): Nodes allowed for the decision.
+            max_depth (int): The deepest iteration.
+            goal (tuple or None): The goal to search for. Chosen from the current state if None.
+
+        Returns:
+            list: The best sequence of actions found.
+        """
+        env = self.env
+        player = env.current_player
+        if goal is None:
+            goal = plan_goal(player, player.partner, env.board)
+        state_hash = self.hasher.hash_state(env) ^ self.hasher.goal_key(goal)
+        self.evaluator.reset()
+        _, allowed_actions = player.action_mask(env.board, env.cities)
+        allowed_actions = list(allowed_actions)
+        if not allowed_actions:
+            return []
+
+        # Interrupted iterations leave the game mid-search; it is restored from here.
+        snapshot = env.snapshot()
+        start = time.perf_counter()
+        first_node = self.nodes
+
+        order = list(range(len(allowed_actions)))
+        best_sequence = ()
+        try:
+            for horizon in range(1, max_depth + 1):
+                self.horizon = horizon
+                results = {}
+                try:
+                    for i in order:
+                        record = player.take_action(allowed_actions[i], env.board, env.cities)
+                        self.evaluator.apply(player, record)
+                        child_hash = self.hasher.update(state_hash, player, record, env.board)
+                        results[i] = self._dfs_4_level(env, 1, (allowed_actions[i],), goal, float('inf'), (),
+                                                       child_hash, record)
+                        self.evaluator.undo()
+                        player.undo_action(record, env.board, env.cities)
+                except _BudgetExhausted:
+                    env.restore(snapshot)
+                    if order[0] in results:
+                        best_sequence = self._best_root_result(results)
+                    break
+
+                best_sequence = self._best_root_result(results)
+                order.sort(key=lambda i: (results[i][0], i))
+
+                # The budget applies from the second iteration on.
+                self._limited = True
+                if time_budget is not None:
+                    self._deadline = start + time_budget
+                if node_budget is not None:
+                    self._node_limit = first_node + node_budget
+        finally:
+            self.horizon = 4
+            self._limited = False
+            self._deadline = self._node_limit = float('inf')
+
+        return list(best_sequence)
+
+    @staticmethod
+    def _best_root_result(results):
+        """
+        Return the best sequence among {first-ply position: (value, sequence)}.
+
+        Ties go to the earliest first-ply action, as in the fixed-depth search.
+        """
+        i = min(results, key=lambda i: (results[i][0], i))
+        return results[i][1]
+
+    def _parallel_root_search(self, goal):
+        """
+        Search the subtree of each first-ply action in the worker processes.
+
+        Each worker searches whole subtrees with its own transposition table. As in the serial
+        search, the first-ply actions are taken best-first by the value of the state they lead
+        to, and each subtree only looks for sequences that beat the best found so far: those
+        with a lower value, or an equal one if its action comes first in the allowed actions.
+        Tasks are handed out one at a time as workers finish, so that later subtrees are
+        searched with the best value found by the earlier ones. The best result is the lowest
+        value, ties going to the first action in the allowed actions, so the sequence chosen is
+        the same as the serial search's.
+
+        Returns:
+            tuple: The best sequence of actions.
+        """
+        if self._pool is None:
+            # forkserver where available, as SharedMemoryVecEnv: workers do not inherit the game.
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers,
+                                             mp_context=mp.get_context(start_method),
+                                             initializer=_init_worker,
+                                             initargs=(self.tt_size, self.prune, self.prune_dominated,
+                                                       self.branch_and_bound))
+
+        env = self.env
+        self.nodes += 1
+        snapshot = env.snapshot()
+        _, allowed_actions = env.current_player.action_mask(env.board, env.cities)
+        self.evaluator.reset()
+        remaining = iter(self._ordered_actions(env, 0, goal, allowed_actions, ()))
+
+        best_value, best_position, best_sequence = float('inf'), -1, ()
+        running = {}    # Future -> position of its first-ply action.
+
+        def submit_next():
+            for position, action in remaining:
+                limit = math.nextafter(best_value, math.inf) if position < best_position else best_value
+                future = self._pool.submit(_search_root_action, snapshot, goal, action, limit)
+                running[future] = position
+                return
+
+        # One task per worker at a time, so that each new task starts from the latest best value.
+        for _ in range(self.n_workers):
+            submit_next()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                position = running.pop(future)
+                value, sequence, nodes, cutoffs = future.result()
+                self.nodes += nodes
+                self.cutoffs += cutoffs
+                if sequence is not None and (value, position) < (best_value, best_position):
+                    best_value, best_position, best_sequence = value, position, sequence
+            for _ in done:
+                submit_next()
         return best_sequence
 
+    def close(self):
+        """
+        Shut down the worker processes of the root-parallel search, if started.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def search_stats(self):
+        """
+        Return the nodes searched, the transposition table counters, the actions pruned and the
+        states cut off by branch and bound.
+
+        The pruning counters only cover searches run in this process.
+        """
+        return {
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "tt": self.tt.stats(),
+            "pruned": self.pruner.stats(),
+        }
+
 
     def play(self, episodes=1):
         """
@@ -223,14 +456,16 @@ class GreedyAgent:
             while not done:
                 # 1) Get the "best" sequence of up to 4 actions.
                 action_sequence = self.select_best_4step_sequence()
-                # print(f"Best action sequence: {action_sequence}")
-                action_sequence_idx = [self.env.current_player.all_actions.index(action) for action in action_sequence]
-
-                # 2) Execute each action in that sequence, stopping if game ends.
-                for action in action_sequence_idx:
-                    obs, reward, done, _, _ = self.env.step(action)
+                # print(f"Best action sequence: {[self.env.current_player.all_actions[action] for action in action_sequence]}")
+
+                # 2) Execute the sequence a turn at a time, stopping if game ends.
+                while action_sequence and not done:
+                    turn = action_sequence[:4 - self.env.actions_taken]
+                    action_sequence = action_sequence[len(turn):]
+                    obs, reward, done, _, info = self.env.step_turn(turn, stop_at_invalid=True)
+                    if info["applied"] < len(turn):
+                        break
                     #self.env.render()
 
                     if done:
-                        print(f"Game ended with reward: {reward}")
-                        break
+                        print(f"Game ended with reward: {info['rewards'][-1]}")
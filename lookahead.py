@@ -0,0 +1,71 @@
+"""
+The goal selection and play loop shared by the agents that plan 8 plies: the current player's
+turn and the partner's next one.
+"""
+from goals import plan_goal
+
+
+class LookaheadAgent:
+    """
+    Base of the 8-ply lookahead agents. Subclasses implement select_best_4step_sequence().
+    """
+
+    def __init__(self, env):
+        """
+        Parameters:
+            env (PandemicEnv): The game to play.
+        """
+        self.env = env
+        self.nodes = 0      # Search nodes expanded so far, for benchmarking.
+
+    def choose_goal(self):
+        """
+        Return the goal of the player whose turn it is, to search towards.
+        """
+        player = self.env.current_player
+        return plan_goal(player, player.partner, self.env.board)
+
+    def select_best_4step_sequence(self):
+        """
+        Return the best sequence of actions found from the current state.
+        """
+        raise NotImplementedError
+
+    def search_stats(self):
+        """
+        Return the nodes searched.
+        """
+        return {"nodes": self.nodes}
+
+    def play(self, episodes=1):
+        """
+        Runs the agent for a given number of episodes,
+        using the 4-step lookahead strategy.
+
+        Each sequence covers the current turn and the partner's next one. The partner's actions
+        are planned before the draws and infections that end the current turn, so the sequence
+        is played up to the first of them that is no longer allowed, and then planned again.
+        """
+        for i in range(episodes):
+            print(f"Starting episode {i + 1}")
+            obs = self.env.reset()
+            done = False
+
+            while not done:
+                # 1) Get the "best" sequence of up to 4 actions.
+                action_sequence = self.select_best_4step_sequence()
+                print(f"Best action sequence: {[self.env.current_player.all_actions[action] for action in action_sequence]}")
+
+                # 2) Execute the sequence a turn at a time, stopping if game ends or at the first
+                #    partner action no longer allowed.
+                while action_sequence and not done:
+                    turn = action_sequence[:4 - self.env.actions_taken]
+                    action_sequence = action_sequence[len(turn):]
+                    obs, reward, done, _, info = self.env.step_turn(turn, stop_at_invalid=True)
+                    if self.env.render_mode is not None:
+                        self.env.render()
+
+                    if done:
+                        print(f"Game ended with reward: {info['rewards'][-1]}")
+                    if info["applied"] < len(turn):
+                        break
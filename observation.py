@@ -0,0 +1,164 @@
+import numpy as np
+from topology import CITY_NAMES, CITY_INDEX, CITY_COLORS, DISTANCE_MATRIX, N_CITIES
+
+# Per-city feature layout (35 floats per city, cities in CITY_NAMES order):
+#   0      share knowledge location flag
+#   1      city color (color encoder / 2)
+#   2-4    yellow, blue and red cubes (/ 3)
+#   5-6    card in player 1 hand, player 1 location
+#   7-8    card in player 2 hand, player 2 location
+#   9      card in infection discard pile
+#   10     card in player discard pile
+#   11-34  distance to every city (/ 8)
+# followed by 9 global features (game round, player id, player turn, outbreak count,
+# infection rate, yellow/blue/red cure and find cure goal).
+CITY_FEATURES = 35
+N_GLOBALS = 9
+OBS_SIZE = N_CITIES * CITY_FEATURES + N_GLOBALS
+
+SHARE_SLOT = 0
+COLOR_SLOT = 1
+CUBE_SLOTS = (2, 3, 4)
+HAND_SLOTS = (5, 7)
+LOCATION_SLOTS = (6, 8)
+INFECTION_DISCARD_SLOT = 9
+PLAYER_DISCARD_SLOT = 10
+DISTANCE_SLOT = 11
+GLOBALS_OFFSET = N_CITIES * CITY_FEATURES
+
+
+class ObservationEncoder:
+    """
+    Encodes the game state into the flat observation vector of PandemicEnv.
+
+    The encoder owns a single preallocated float32 buffer. The static block (city colors and
+    distances) is written once, and each update only rewrites the dynamic slots that changed
+    since the previous encoding.
+    """
+
+    def __init__(self):
+        self.buffer = np.zeros(OBS_SIZE, dtype=np.float32)
+        # [city, feature] view over the per-city part of the buffer.
+        self.city_block = self.buffer[:GLOBALS_OFFSET].reshape(N_CITIES, CITY_FEATURES)
+        self.globals = self.buffer[GLOBALS_OFFSET:]
+
+        self.city_block[:, COLOR_SLOT] = np.array(CITY_COLORS) / 2
+        self.city_block[:, DISTANCE_SLOT:] = DISTANCE_MATRIX / 8
+
+        self.clear()
+
+    def invalidate(self):
+        """
+        Mark the buffer as out of sync with the game state, e.g. after a reset or a restore.
+        The next encode() rewrites every dynamic slot.
+        """
+        self.valid = False
+
+    def clear(self):
+        """
+        Zero all dynamic slots and forget what was previously encoded.
+        """
+        self.valid = True
+        self.city_block[:, SHARE_SLOT] = 0
+        self.city_block[:, CUBE_SLOTS[0]:DISTANCE_SLOT] = 0
+        self.globals[:] = 0
+        self.share_location = None
+        self.hands = [set(), set()]
+        self.locations = [None, None]
+        self.infection_discard_len = 0
+        self.epidemic_count = None      # Epidemics the infection discard flags were written after.
+        self.player_discard_len = 0
+
+    def encode(self, env, dirty_cities=None):
+        """
+        Update the buffer from the environment state and return a copy of it.
+
+        Parameters:
+            env (PandemicEnv): The environment to encode.
+            dirty_cities (iterable or None): Names of the only cities whose cubes may have changed
+                since the last call. If None, the cubes of every city are rewritten.
+
+        Returns:
+            numpy.ndarray: The 849-float observation vector.
+        """
+        if not self.valid:
+            self.clear()
+            dirty_cities = None
+
+        board = env.board
+        city_block = self.city_block
+        find_cure, share_knowledge, share_knowledge_location = env.current_player.goal
+
+        # Share knowledge location flag.
+        share_location = share_knowledge_location if share_knowledge else None
+        if share_location != self.share_location:
+            if self.share_location is not None:
+                city_block[CITY_INDEX[self.share_location], SHARE_SLOT] = 0
+            if share_location is not None:
+                city_block[CITY_INDEX[share_location], SHARE_SLOT] = 1
+            self.share_location = share_location
+
+        # Disease cubes.
+        cities = env.cities
+        for name in (CITY_NAMES if dirty_cities is None else dirty_cities):
+            cubes = cities[name].cubes
+            row = city_block[CITY_INDEX[name]]
+            row[2] = cubes[0] / 3
+            row[3] = cubes[1] / 3
+            row[4] = cubes[2] / 3
+
+        # Player hands and locations.
+        for idx, player in enumerate((env.player_1, env.player_2)):
+            hand = set(player.hand)
+            previous_hand = self.hands[idx]
+            if hand != previous_hand:
+                slot = HAND_SLOTS[idx]
+                for card in previous_hand - hand:
+                    city_block[CITY_INDEX[card], slot] = 0
+                for card in hand - previous_hand:
+                    city_block[CITY_INDEX[card], slot] = 1
+                self.hands[idx] = hand
+
+            location = player.loc.name
+            previous_location = self.locations[idx]
+            if location != previous_location:
+                slot = LOCATION_SLOTS[idx]
+                if previous_location is not None:
+                    city_block[CITY_INDEX[previous_location], slot] = 0
+                city_block[CITY_INDEX[location], slot] = 1
+                self.locations[idx] = location
+
+        # Discard piles only grow, except when an epidemic shuffles the infection discard pile back.
+        # The epidemic's own draws can refill the pile past its old length, so the reset is told
+        # from the epidemic count rather than from the length.
+        infection_discard_pile = board.infection_discard_pile
+        if board.epidemic_count != self.epidemic_count:
+            city_block[:, INFECTION_DISCARD_SLOT] = 0
+            self.infection_discard_len = 0
+            self.epidemic_count = board.epidemic_count
+        for card in infection_discard_pile[self.infection_discard_len:]:
+            city_block[CITY_INDEX[card], INFECTION_DISCARD_SLOT] = 1
+        self.infection_discard_len = len(infection_discard_pile)
+
+        player_discard_pile = board.player_discard_pile
+        if len(player_discard_pile) < self.player_discard_len:
+            city_block[:, PLAYER_DISCARD_SLOT] = 0
+            self.player_discard_len = 0
+        for card in player_discard_pile[self.player_discard_len:]:
+            city_block[CITY_INDEX[card], PLAYER_DISCARD_SLOT] = 1
+        self.player_discard_len = len(player_discard_pile)
+
+        # Global features.
+        self.globals[:] = (
+            env.game_round / 10,
+            env.current_player.id - 1,
+            env.actions_taken / 4,
+            board.outbreak_count / 4,
+            board.infection_rate / 3,
+            board.yellow_cure,
+            board.blue_cure,
+            board.red_cure,
+            1 if find_cure else 0,
+        )
+
+        return self.buffer.copy()
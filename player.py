@@ -1,5 +1,20 @@
-import random
-from constants import CITIES
+import numpy as np
+from actions import (ACTIONS, ACTION_NAMES, DRIVE, DIRECT, CHARTER, TREAT, SHARE, FIND,
+                     DRIVE_OFFSET, DIRECT_OFFSET, CHARTER_OFFSET, TREAT_OFFSET, SHARE_ACTION, FIND_OFFSET,
+                     N_ACTIONS)
+from topology import CITY_NAMES, CITY_INDEX, CARD_COLORS, NEIGHBORS, N_CITIES
+
+# Attribute names of the Board cure flags, indexed by color id.
+CURE_ATTRS = ("yellow_cure", "blue_cure", "red_cure")
+
+# Location-only parts of the action mask, indexed by city id: the DRIVE actions (in connection
+# order), the set of neighbor names, and the CHARTER FLIGHT actions to every non-adjacent city.
+DRIVE_ACTIONS = tuple(tuple(DRIVE_OFFSET + neighbor for neighbor in neighbors) for neighbors in NEIGHBORS)
+NEIGHBOR_NAMES = tuple(frozenset(CITY_NAMES[neighbor] for neighbor in neighbors) for neighbors in NEIGHBORS)
+CHARTER_ACTIONS = tuple(
+    tuple(CHARTER_OFFSET + city for city in range(N_CITIES) if city != loc and city not in NEIGHBORS[loc])
+    for loc in range(N_CITIES)
+)
 
 class Player:
     """
@@ -11,12 +26,13 @@ class Player:
         color: The player's color.
         shape: The player's shape.
         hand: A list of city cards held by the player.
+        color_counts: The number of cards of each color id in hand, kept up to date with it.
         active: A flag indicating if the player is currently active (e.g., it's their turn).
-        all_actions: A pre-computed list of all possible actions the player might take.
+        all_actions: The names of all possible actions, indexed by action id (see actions.py).
         partner: The partner player with whom knowledge sharing is possible.
     """
 
-    def __init__(self, id, loc, role, color, shape, init_hand, partner):
+    def __init__(self, id, loc, role, color, shape, init_hand, partner, rng=None):
         """
         Initialize the Player with its attributes.
 
@@ -28,37 +44,47 @@ class Player:
             shape: The player's shape.
             init_hand: The initial list of city cards in the player's hand.
             partner: The partner Player object.
+            rng: The numpy.random.Generator random actions are drawn from (a fresh one if None).
         """
         self.id = id
         self.loc = loc
         self.role = role
         self.color = color
         self.shape = shape
-        self.hand = init_hand
+        self.set_hand(init_hand)
         self.previous_loc = loc.name
         self.goal = None
         self.actions = []
 
-        # Build the list of all possible actions.
-        # The first list comprehension generates movement actions:
-        # - "DRIVE to <city>" for each neighboring city.
-        # - "DIRECT FLIGHT to <city>" for each city card in hand.
-        # - "CHARTER FLIGHT to <city>" for each city (if the player's hand contains the current city).
-        self.all_actions = [
-            f"{action} TO {city}"
-            for action in ["DRIVE", "DIRECT FLIGHT", "CHARTER FLIGHT"]
-            for city in CITIES.keys()
-        ] + [
-            "TREAT YELLOW", 
-            "TREAT BLUE", 
-            "TREAT RED", 
-            "SHARE KNOWLEDGE", 
-            "FIND CURE YELLOW",
-            "FIND CURE BLUE",
-            "FIND CURE RED"
-        ]
+        # The action table is shared by all players and never changes.
+        self.all_actions = ACTION_NAMES
+
+        # Preallocated action mask, the allowed actions it holds and the state it was computed for.
+        self.mask = np.zeros(N_ACTIONS, dtype=bool)
+        self.allowed_actions = []
+        self.mask_key = None
 
         self.partner = partner
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def set_hand(self, cards):
+        """
+        Replace the player's hand, recounting its colors.
+
+        Parameters:
+            cards (list): The city cards of the new hand.
+        """
+        self.hand = cards
+        self.color_counts = [0, 0, 0]
+        for card in self.hand:
+            self.color_counts[CARD_COLORS[card]] += 1
+
+    def add_card(self, card):
+        """
+        Add a city card to the player's hand.
+        """
+        self.hand.append(card)
+        self.color_counts[CARD_COLORS[card]] += 1
 
     def discard_cards(self, cards, board):
         """
@@ -66,193 +92,230 @@ class Player:
         """
         for card in cards:
             self.hand.remove(card)
-            board.player_discard_pile.append(card)  # Add the card to the discard pile
+            self.color_counts[CARD_COLORS[card]] -= 1
+            board.discard_card(card)  # Add the card to the discard pile
 
     def action_mask(self, board, cities):
         """
         Create an action mask for the player indicating which actions are allowed.
 
-        The action mask is a list of 1's and 0's corresponding to each action in `self.all_actions`
-        (1 if the action is allowed, 0 otherwise).
+        The mask is written into the player's preallocated boolean array, which is only recomputed
+        when the player's location or hand, the partner's location or hand, the cures or the cubes
+        in the current city changed since the previous call.
 
         Parameters:
             board: The game board object, containing global game state (e.g., cures, cube counts).
             cities: A dictionary mapping city names to city objects.
 
         Returns:
-            A list of integers (1 or 0) representing allowed actions.
+            A boolean array marking the allowed actions, and the list of allowed action indices.
+            Both are reused by later calls and must be copied to be kept.
         """
-        allowed_actions = []
+        loc = self.loc
+        loc_name = loc.name
+        key = (loc_name, tuple(self.hand), self.partner.loc.name, loc_name in self.partner.hand,
+               board.yellow_cure, board.blue_cure, board.red_cure,
+               *loc.cubes)
+        if key == self.mask_key:
+            return self.mask, self.allowed_actions
+
+        loc_idx = CITY_INDEX[loc_name]
+        connections = NEIGHBOR_NAMES[loc_idx]
 
         # DRIVE: Allowed to move to any directly connected city.
-        allowed_actions.extend([f"DRIVE TO {city}" for city in self.loc.connections])
+        allowed_actions = list(DRIVE_ACTIONS[loc_idx])
 
         # DIRECT FLIGHT: Allowed to fly to any city for which the player holds the corresponding card.
-        allowed_actions.extend([f"DIRECT FLIGHT TO {city}" for city in self.hand if not city == self.loc.name
-                                and city not in self.loc.connections])
+        allowed_actions.extend([DIRECT_OFFSET + CITY_INDEX[city] for city in self.hand if not city == loc_name
+                                and city not in connections])
 
         # CHARTER FLIGHT: If the player holds the card of their current city, they may fly anywhere.
-        if self.loc.name in self.hand:
-            allowed_actions.extend([f"CHARTER FLIGHT TO {city}" for city in CITIES.keys() if not city == self.loc.name
-                                    and city not in self.loc.connections])
+        if loc_name in self.hand:
+            allowed_actions.extend(CHARTER_ACTIONS[loc_idx])
 
         # TREAT: Allowed if the current city has infection cubes.
-        if self.loc.infection_yellow > 0:
-            allowed_actions.append("TREAT YELLOW")
-        if self.loc.infection_blue > 0:
-            allowed_actions.append("TREAT BLUE")
-        if self.loc.infection_red > 0:
-            allowed_actions.append("TREAT RED")
+        cubes = loc.cubes
+        if cubes[0] > 0:
+            allowed_actions.append(TREAT_OFFSET + 0)
+        if cubes[1] > 0:
+            allowed_actions.append(TREAT_OFFSET + 1)
+        if cubes[2] > 0:
+            allowed_actions.append(TREAT_OFFSET + 2)
 
         # SHARE KNOWLEDGE: Allowed if both players are in the same city and one of them holds the card for that city.
-        if self.loc.name == self.partner.loc.name:
-            if self.loc != self.partner.loc:
+        if loc_name == self.partner.loc.name:
+            if loc != self.partner.loc:
                 raise ValueError("Players are not in the same city.")
-            if self.loc.name in self.hand:
-                allowed_actions.append("SHARE KNOWLEDGE")
-            if self.loc.name in self.partner.hand:
-                allowed_actions.append("SHARE KNOWLEDGE")
+            if loc_name in self.hand or loc_name in self.partner.hand:
+                allowed_actions.append(SHARE_ACTION)
 
         # FIND CURE: Allowed if at the research station ("GENÈVE"), the player has at least 4 cards of a color,
         # and a cure for that color has not been found.
-        if self.loc.name == "GENÈVE":
-            # Create a list of colors corresponding to the player's hand cards.
-            hand_colors = [cities[card].color for card in self.hand]
-            if hand_colors.count("YELLOW") >= 4 and not board.yellow_cure:
-                allowed_actions.append("FIND CURE YELLOW")
-            if hand_colors.count("BLUE") >= 4 and not board.blue_cure:
-                allowed_actions.append("FIND CURE BLUE")
-            if hand_colors.count("RED") >= 4 and not board.red_cure:
-                allowed_actions.append("FIND CURE RED")
-
-        # Build the action mask: mark each action in all_actions as allowed (1) or not allowed (0).
-        action_mask = [1 if action in allowed_actions else 0 for action in self.all_actions]
-
-        # print(allowed_actions)
-        return action_mask, allowed_actions
+        if loc_name == "GENÈVE":
+            color_counts = self.color_counts
+            if color_counts[0] >= 4 and not board.yellow_cure:
+                allowed_actions.append(FIND_OFFSET + 0)
+            if color_counts[1] >= 4 and not board.blue_cure:
+                allowed_actions.append(FIND_OFFSET + 1)
+            if color_counts[2] >= 4 and not board.red_cure:
+                allowed_actions.append(FIND_OFFSET + 2)
+
+        # Write the mask in place: clear the previous allowed actions and mark the new ones.
+        self.mask[self.allowed_actions] = False
+        self.mask[allowed_actions] = True
+        self.allowed_actions = allowed_actions
+        self.mask_key = key
+
+        return self.mask, allowed_actions
     
     def random_action(self, action_mask):
         """
         Randomly select an action from the allowed actions, based on the action mask.
 
         Parameters:
-            action_mask: A list of integers (1 or 0) representing allowed actions.
+            action_mask: The (mask, allowed actions) pair returned by action_mask().
 
         Returns:
-            A string representing the selected action.
+            int: The index of the selected action.
         """
         action_mask, _ = action_mask
         # Select a random action from the allowed actions.
-        action_idx = random.choice([i for i, v in enumerate(action_mask) if v == 1])
-        action = self.all_actions[action_idx]
-        return action
+        return int(self.rng.choice(np.flatnonzero(action_mask)))
 
     def take_action(self, action, board, cities):
         """
         Execute the given action, updating the player's state and the game board accordingly.
 
         Parameters:
-            action (str): The action string to be executed.
+            action (int): The index of the action to be executed (see actions.py).
             board: The game board object, containing global game state.
             cities: A dictionary mapping city names to city objects.
+
+        Returns:
+            tuple: An undo record (action, previous location, giver, card index, cube color,
+            cubes removed, previous hand) that undo_action() uses to restore the prior state.
         """
-        tokens = action.split()
-        action_type = tokens[0]
-        init_board = board
-        init_cities = cities
-        init_hand = self.hand
-        init_loc = self.loc
-        init_partner_hand = self.partner.hand
-
-        if action_type == "DRIVE":
+        kind, target, color = ACTIONS[action]
+        prev_loc = self.loc
+        giver = None                # Player whose hand lost a card by DIRECT, CHARTER or SHARE.
+        card_index = None           # Position of that card in the giver's hand.
+        cube_color = None           # Color id of the cubes removed by TREAT or the Containment Specialist.
+        cubes_removed = 0
+        previous_hand = None        # Hand before FIND CURE, which rebuilds the hand list.
+
+        if kind == DRIVE:
             # For a DRIVE action, move the player to the target city (must be directly connected).
-            target_city_name = tokens[-1]
-            self.loc = cities[target_city_name]
+            self.loc = cities[CITY_NAMES[target]]
 
-        elif action_type == "DIRECT":
+        elif kind == DIRECT:
             # For a DIRECT FLIGHT, remove the target city card from the player's hand and move there.
-            target_city_name = tokens[-1]
-            self.hand.remove(target_city_name)
+            target_city_name = CITY_NAMES[target]
+            giver, card_index = self, self.hand.index(target_city_name)
+            del self.hand[card_index]
+            self.color_counts[CARD_COLORS[target_city_name]] -= 1
             self.loc = cities[target_city_name]
-            board.player_discard_pile.append(target_city_name)  # Add the card to the discard pile
+            board.discard_card(target_city_name)  # Add the card to the discard pile
 
-        elif action_type == "CHARTER":
+        elif kind == CHARTER:
             # For a CHARTER FLIGHT, remove the card corresponding to the current city and fly to any city.
-            self.hand.remove(self.loc.name)
-            target_city_name = tokens[-1]
-            self.loc = cities[target_city_name]
-            board.player_discard_pile.append(self.loc.name)  # Add the card to the discard pile
+            giver, card_index = self, self.hand.index(self.loc.name)
+            del self.hand[card_index]
+            self.color_counts[CARD_COLORS[self.loc.name]] -= 1
+            self.loc = cities[CITY_NAMES[target]]
+            board.discard_card(self.loc.name)  # Add the card to the discard pile
 
-        if action_type == "DRIVE" or action_type=="DIRECT" or action_type=="CHARTER":
+        if kind == DRIVE or kind == DIRECT or kind == CHARTER:
             if self.role == "CONTAINMENT":
-                if self.loc.infection_yellow >= 2:
-                    self.loc.infection_yellow -= 1
-                    board.yellow_cubes += 1
-                elif self.loc.infection_blue >= 2:
-                    self.loc.infection_blue -= 1
-                    board.blue_cubes += 1
-                elif self.loc.infection_red >= 2:
-                    self.loc.infection_red -= 1
-                    board.red_cubes += 1
-
-        elif action_type == "TREAT":
+                # Remove one cube of the first color (yellow, blue, red) with 2 or more cubes.
+                cubes = self.loc.cubes
+                for cube_color in range(3):
+                    if cubes[cube_color] >= 2:
+                        cubes[cube_color] -= 1
+                        board.cube_supply[cube_color] += 1
+                        cubes_removed = 1
+                        break
+                else:
+                    cube_color = None
+
+        elif kind == TREAT:
             # For a TREAT action, remove infection cubes from the current city.
             # If a cure has not been found for that color, only one cube is removed.
             # Otherwise, all cubes are removed.
-            color = tokens[-1]
-            if color == "YELLOW":
-                if not board.yellow_cure:
-                    self.loc.infection_yellow -= 1
-                    board.yellow_cubes += 1
-                else:
-                    board.yellow_cubes += self.loc.infection_yellow
-                    self.loc.infection_yellow = 0
-            elif color == "BLUE":
-                if not board.blue_cure:
-                    self.loc.infection_blue -= 1
-                    board.blue_cubes += 1
-                else:
-                    board.blue_cubes += self.loc.infection_blue
-                    self.loc.infection_blue = 0
-            elif color == "RED":
-                if not board.red_cure:
-                    self.loc.infection_red -= 1
-                    board.red_cubes += 1
-                else:
-                    board.red_cubes += self.loc.infection_red
-                    self.loc.infection_red = 0
+            cube_color = color
+            cubes_removed = 1 if not getattr(board, CURE_ATTRS[color]) else self.loc.cubes[color]
+            self.loc.cubes[color] -= cubes_removed
+            board.cube_supply[color] += cubes_removed
 
-        elif action_type == "SHARE":
+        elif kind == SHARE:
             # For SHARE KNOWLEDGE, the player who holds the card for the current city gives it to their partner.
             if self.loc.name in self.hand:
-                self.hand.remove(self.loc.name)
-                self.partner.hand.append(self.loc.name)
+                giver, receiver = self, self.partner
             else:
-                self.partner.hand.remove(self.loc.name)
-                self.hand.append(self.loc.name)
+                giver, receiver = self.partner, self
+            card_index = giver.hand.index(self.loc.name)
+            del giver.hand[card_index]
+            giver.color_counts[CARD_COLORS[self.loc.name]] -= 1
+            receiver.add_card(self.loc.name)
 
-        elif action_type == "FIND":
+        elif kind == FIND:
             # For FIND CURE, mark the cure as found for the specified disease color.
-            color = tokens[-1]
-            if color == "YELLOW":
-                board.yellow_cure = True
-            elif color == "BLUE":
-                board.blue_cure = True
-            elif color == "RED":
-                board.red_cure = True
+            setattr(board, CURE_ATTRS[color], True)
 
             # Remove the 4 cards of the same color from the player's hand.
             cities_to_remove = []
             for card in self.hand:
-                if cities[card].color == color:
+                if CARD_COLORS[card] == color:
                     cities_to_remove.append(card)
-                    board.player_discard_pile.append(card)  # Add the card to the discard pile
+                    board.discard_card(card)  # Add the card to the discard pile
                 if len(cities_to_remove) == 4:
                     break
             
+            previous_hand = self.hand
             self.hand = [city for city in self.hand if city not in cities_to_remove]
+            self.color_counts[color] -= len(cities_to_remove)
+
+        return action, prev_loc, giver, card_index, cube_color, cubes_removed, previous_hand
 
-        return init_board, init_cities, init_hand, init_loc, init_partner_hand
+    def undo_action(self, record, board, cities):
+        """
+        Revert an action executed by take_action(), restoring the exact prior state.
+
+        Actions must be undone in the reverse order in which they were taken.
+
+        Parameters:
+            record (tuple): The undo record returned by take_action().
+            board: The game board object, containing global game state.
+            cities: A dictionary mapping city names to city objects.
+        """
+        action, prev_loc, giver, card_index, cube_color, cubes_removed, previous_hand = record
+        kind, _, color = ACTIONS[action]
+
+        # Put back the cubes removed in the current city by TREAT or the Containment Specialist.
+        if cubes_removed:
+            self.loc.cubes[cube_color] += cubes_removed
+            board.cube_supply[cube_color] -= cubes_removed
+
+        if kind == DIRECT or kind == CHARTER:
+            card = self.loc.name if kind == DIRECT else prev_loc.name
+            board.undo_discards(1)
+            self.hand.insert(card_index, card)
+            self.color_counts[CARD_COLORS[card]] += 1
+
+        elif kind == SHARE:
+            receiver = self.partner if giver is self else self
+            receiver.hand.pop()
+            receiver.color_counts[CARD_COLORS[self.loc.name]] -= 1
+            giver.hand.insert(card_index, self.loc.name)
+            giver.color_counts[CARD_COLORS[self.loc.name]] += 1
+
+        elif kind == FIND:
+            setattr(board, CURE_ATTRS[color], False)
+            n_cured = len(previous_hand) - len(self.hand)
+            board.undo_discards(n_cured)
+            self.hand = previous_hand
+            self.color_counts[color] += n_cured
+
+        self.loc = prev_loc
 
     def step(self, board, cities, action=None):
         """
@@ -267,5 +330,5 @@ class Player:
         action_mask = self.action_mask(board, cities)
         if action is None:
             action = self.random_action(action_mask)
-        print(self.id, action)
+        print(self.id, self.all_actions[action])
         self.take_action(action, board, cities)
@@ -1,22 +1,17 @@
-import gymnasium as gym
-import numpy as np
+import argparse
+import glob
+import os
 from env import PandemicEnv
+from subproc_vec_env import SharedMemoryVecEnv
+from vec_env import PandemicVecEnv
 from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
-from sb3_contrib.common.wrappers import ActionMasker
 from sb3_contrib.ppo_mask import MaskablePPO
+from stable_baselines3.common.callbacks import CheckpointCallback
 from datetime import datetime
 
 
-def mask_fn(env: gym.Env) -> np.ndarray:
-    # Do whatever you'd like in this function to return the action mask
-    # for the current env. In this example, we assume the env has a
-    # helpful method we can rely on.
-    # print(env.valid_action_mask())
-    return env.valid_action_mask()
-
-
-env = PandemicEnv()  # Initialize env
-env = ActionMasker(env, mask_fn)  # Wrap to enable masking
+MODEL_DIR = "./ppo/models"
+LOG_DIR = "./ppo/"
 
 # Define a larger network architecture:
 policy_kwargs = dict(
@@ -26,31 +21,96 @@ policy_kwargs = dict(
     }
 )
 
-# MaskablePPO behaves the same as SB3's PPO unless the env is wrapped
-# with ActionMasker. If the wrapper is detected, the masks are automatically
-# retrieved and used when learning. Note that MaskablePPO does not accept
-# a new action_mask_fn kwarg, as it did in an earlier draft.
-model = MaskablePPO(MaskableActorCriticPolicy, env, verbose=1, tensorboard_log="./ppo/", policy_kwargs=policy_kwargs)
-model.learn(100_000, progress_bar=True)
-model.save("./ppo/models/ppo_pandemic-{}".format(datetime.now().strftime("%Y%m%d-%H%M%S")))
-
-# Note that use of masks is manual and optional outside of learning,
-# so masking can be "removed" at testing time
-# model.predict(observation, action_masks=valid_action_array)
-
-for _ in range(100):
-    env = PandemicEnv()
-    obs, _ = env.reset()
-    terminated = False
-    while not terminated:
-        # Render the state after each action
-        env.render()
-        action, _states = model.predict(obs, action_masks=env.valid_action_mask())
-        print(env.current_player.id, env.current_player.all_actions[action])
-        obs, reward, terminated, truncated, info = env.step(action)
-        print("--------------------")
-        for key, value in env.decode_obs(obs).items():
-            print(key+"-"*(14-len(key)), value)
-        print(info)
-        print(reward)
-        print("--------------------")
\ No newline at end of file
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train a MaskablePPO agent on Pandemic.")
+    parser.add_argument("--n-envs", type=int, default=16, help="Number of games played at once.")
+    parser.add_argument("--n-workers", type=int, default=None,
+                        help="Number of worker processes (default: one per core).")
+    parser.add_argument("--engine", choices=["subproc", "vec"], default="subproc",
+                        help="'subproc' runs PandemicEnv games in worker processes sharing memory with the "
+                             "learner; 'vec' runs them all in this process with PandemicVecEnv.")
+    parser.add_argument("--timesteps", type=int, default=100_000, help="Number of environment steps to train for.")
+    parser.add_argument("--checkpoint-freq", type=int, default=100_000,
+                        help="Save a checkpoint to ./ppo/models every this many environment steps.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Continue training from a saved model, or from the latest one if no path is given.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the training games.")
+    parser.add_argument("--eval-episodes", type=int, default=100,
+                        help="Number of rendered games to play with the trained model.")
+    return parser.parse_args()
+
+
+def latest_model(model_dir=MODEL_DIR):
+    """
+    Return the path of the most recently written model in model_dir.
+    """
+    models = glob.glob(os.path.join(model_dir, "*.zip"))
+    if not models:
+        raise FileNotFoundError(f"No saved model to resume from in {model_dir}")
+    return max(models, key=os.path.getmtime)
+
+
+def make_env(args):
+    # Both engines expose action_masks() themselves, so they do not need the ActionMasker wrapper.
+    if args.engine == "vec":
+        return PandemicVecEnv(args.n_envs, seed=args.seed)
+    return SharedMemoryVecEnv(args.n_envs, n_workers=args.n_workers, seed=args.seed)
+
+
+def train(args):
+    env = make_env(args)
+
+    # CheckpointCallback counts calls to env.step(), each of which advances n_envs games.
+    checkpoint_callback = CheckpointCallback(
+        save_freq=max(args.checkpoint_freq // args.n_envs, 1),
+        save_path=MODEL_DIR,
+        name_prefix="ppo_pandemic",
+    )
+
+    # MaskablePPO behaves the same as SB3's PPO unless the env exposes
+    # action_masks(). If it does, the masks are automatically
+    # retrieved and used when learning. Note that MaskablePPO does not accept
+    # a new action_mask_fn kwarg, as it did in an earlier draft.
+    if args.resume:
+        path = latest_model() if args.resume == "latest" else args.resume
+        print(f"Resuming from {path}")
+        model = MaskablePPO.load(path, env=env, tensorboard_log=LOG_DIR)
+    else:
+        model = MaskablePPO(MaskableActorCriticPolicy, env, verbose=1, tensorboard_log=LOG_DIR,
+                            policy_kwargs=policy_kwargs, seed=args.seed)
+
+    model.learn(args.timesteps, callback=checkpoint_callback, progress_bar=True,
+                reset_num_timesteps=not args.resume)
+    model.save(os.path.join(MODEL_DIR, "ppo_pandemic-{}".format(datetime.now().strftime("%Y%m%d-%H%M%S"))))
+    env.close()
+    return model
+
+
+def evaluate(model, episodes):
+    # Note that use of masks is manual and optional outside of learning,
+    # so masking can be "removed" at testing time
+    # model.predict(observation, action_masks=valid_action_array)
+    for _ in range(episodes):
+        env = PandemicEnv(render_mode="human")
+        obs, info = env.reset()
+        terminated = False
+        while not terminated:
+            # Render the state after each action
+            env.render()
+            action, _states = model.predict(obs, action_masks=info["action_mask"])
+            print(env.current_player.id, env.current_player.all_actions[action])
+            obs, reward, terminated, truncated, info = env.step(action)
+            print("--------------------")
+            for key, value in env.decode_obs(obs).items():
+                print(key+"-"*(14-len(key)), value)
+            print(info)
+            print(reward)
+            print("--------------------")
+
+
+# Worker processes may import this module, so training only starts under the main guard.
+if __name__ == "__main__":
+    args = parse_args()
+    model = train(args)
+    evaluate(model, args.eval_episodes)
@@ -18,13 +18,13 @@ model = MaskablePPO.load("./ppo/models/ppo_pandemic-20250217-235210", env=Pandem
 # model.predict(observation, action_masks=valid_action_array)
 
 for _ in range(100):
-    env = PandemicEnv()
-    obs, _ = env.reset()
+    env = PandemicEnv(render_mode="human")
+    obs, info = env.reset()
     terminated = False
     while not terminated:
         # Render the state after each action
         env.render()
-        action, _states = model.predict(obs, action_masks=env.valid_action_mask())
+        action, _states = model.predict(obs, action_masks=info["action_mask"])
         print(env.current_player.id, env.current_player.all_actions[action], env.current_player.goal)
         obs, reward, terminated, truncated, info = env.step(action)
         print("--------------------")
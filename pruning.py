@@ -0,0 +1,194 @@
+"""
+Move pruning for the exhaustive lookahead search.
+
+Many sequences of a turn reach the same state. Two of the patterns are cheap to recognise
+from the previous action alone, and for both a single ordering is kept:
+
+- Commuting actions. Actions taken in the same city that touch different things (TREAT of
+  two colors, TREAT and SHARE, FIND CURE of another color than the one treated or shared)
+  give the same state in either order. Only the order in which the later action comes later
+  in the allowed actions is searched.
+- Equivalent stopovers. After a DRIVE from P to X, moving on from X by DRIVE or DIRECT FLIGHT
+  ends in the same state as moving on from a city X' driven to from P instead, as long as
+  neither X nor X' makes the Containment Specialist remove a cube. The same holds for two
+  CHARTER FLIGHTs out of P to cities of the same color, which spend and discard the same
+  cards. Only the stopover tried first is searched. Going back to P is included, so it is
+  searched once instead of once per neighbor.
+
+Every skipped sequence has an equivalent one that the search visits earlier, so the best value
+and the first sequence reaching it, the search's choice, are unchanged.
+
+Optionally, returning to the previous city right after driving out of it can be skipped
+altogether. That is not always safe: wasting two actions is sometimes the best a turn can do,
+so it is off by default.
+"""
+from actions import ACTIONS, DRIVE, CHARTER, TREAT, SHARE, FIND, DRIVE_OFFSET, DIRECT_OFFSET
+from player import CHARTER_ACTIONS
+from topology import NEIGHBORS, CITY_INDEX, CITY_NAMES, CITY_COLORS, CARD_COLORS, N_CITIES
+
+_RESEARCH_STATION_COLOR = CARD_COLORS["GENÈVE"]
+_NON_MOVES = tuple(action for action, (kind, _, _) in enumerate(ACTIONS) if kind in (TREAT, SHARE, FIND))
+
+
+def _commute(a, b):
+    """
+    Whether two different actions taken in the same city give the same state in either order.
+    """
+    kind_a, _, color_a = ACTIONS[a]
+    kind_b, _, color_b = ACTIONS[b]
+    kinds = {kind_a, kind_b}
+    if kinds == {TREAT} or kinds == {FIND} or kinds == {TREAT, SHARE}:
+        return True
+    if kinds == {TREAT, FIND}:
+        # FIND CURE changes how many cubes TREAT of its color removes.
+        return color_a != color_b
+    if kinds == {SHARE, FIND}:
+        # FIND CURE is only taken at the research station, whose card SHARE moves.
+        find_color = color_a if kind_a == FIND else color_b
+        return find_color != _RESEARCH_STATION_COLOR
+    return False
+
+
+# Non-move actions that commute with each action and come before it in the allowed actions,
+# which list TREAT, SHARE and FIND CURE in action id order.
+EARLIER_COMMUTING = {
+    a: frozenset(b for b in _NON_MOVES if b < a and _commute(a, b)) for a in _NON_MOVES
+}
+
+
+def _earlier_stopovers(targets, same_cards):
+    """
+    Map each target of one kind of move out of a city to the targets tried before it that
+    spend and discard the same cards.
+    """
+    return {
+        target: tuple(other for other in targets[:i] if same_cards(other, target))
+        for i, target in enumerate(targets)
+    }
+
+
+# [city][destination] -> earlier destinations of the same kind of move out of the city. DRIVEs
+# are tried in NEIGHBORS order and spend nothing; CHARTER FLIGHTs are tried in city id order and
+# discard a card of the destination's color.
+EARLIER_DRIVES = tuple(
+    _earlier_stopovers(neighbors, lambda a, b: True) for neighbors in NEIGHBORS
+)
+EARLIER_CHARTERS = tuple(
+    _earlier_stopovers(tuple(ACTIONS[action][1] for action in charters),
+                       lambda a, b: CITY_COLORS[a] == CITY_COLORS[b])
+    for charters in CHARTER_ACTIONS
+)
+
+
+class MovePruner:
+    """
+    Decides which children of a search node to skip, and counts what was skipped.
+
+    The search passes each node a context describing the action that led to it, from
+    context(); skipped() returns the actions not to search from there.
+    """
+
+    def __init__(self, prune_dominated=False):
+        """
+        Parameters:
+            prune_dominated (bool): Also skip driving straight back to the previous city. This
+                can change the decision, see the module docstring.
+        """
+        self.prune_dominated = prune_dominated
+        self._moves_on = {}     # Stopovers -> DRIVE and DIRECT FLIGHT actions to skip.
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Clear the counters.
+        """
+        self.commuting = 0      # Actions skipped as a reordering of commuting actions.
+        self.stopovers = 0      # Moves skipped as made from an equivalent stopover.
+        self.dominated = 0      # Return trips skipped by prune_dominated.
+
+    def context(self, player, record, cities):
+        """
+        Return what skipped() needs to know about the action that led to a node.
+
+        Parameters:
+            player (Player): The player that took the action.
+            record (tuple): The undo record returned by player.take_action().
+            cities (dict): The cities of the game, by name.
+
+        Returns:
+            int, tuple or None: For an action that commutes with earlier ones, the action. For
+            a move, the equivalent stopovers tried before its destination and the DRIVE back to
+            skip (None unless prune_dominated). None if nothing is skipped after it.
+        """
+        action = record[0]
+        if action in EARLIER_COMMUTING:
+            return action if EARLIER_COMMUTING[action] else None
+
+        kind, loc, _ = ACTIONS[action]
+        if kind == DRIVE:
+            earlier = EARLIER_DRIVES[CITY_INDEX[record[1].name]][loc]
+        elif kind == CHARTER:
+            earlier = EARLIER_CHARTERS[CITY_INDEX[record[1].name]][loc]
+        else:
+            # DIRECT FLIGHTs to different cities spend different cards.
+            return None
+        if record[5]:
+            # The Containment Specialist removed a cube on arrival; no other stopover does that.
+            return None
+        if earlier and player.role == "CONTAINMENT":
+            earlier = tuple(city for city in earlier if max(cities[CITY_NAMES[city]].cubes) < 2)
+
+        back = DRIVE_OFFSET + CITY_INDEX[record[1].name] if self.prune_dominated and kind == DRIVE else None
+        if not earlier and back is None:
+            return None
+        return earlier, back
+
+    def skipped(self, context, allowed_actions):
+        """
+        Return the allowed actions not to search after the action described by context.
+
+        Parameters:
+            context (int or tuple): The value of context() for the action leading here.
+            allowed_actions (list): The actions allowed in the current state.
+
+        Returns:
+            frozenset: The actions to skip.
+        """
+        if context.__class__ is int:
+            skip = EARLIER_COMMUTING[context].intersection(allowed_actions)
+            self.commuting += len(skip)
+            return skip
+
+        earlier, back = context
+        moves_on = self._moves_on.get(earlier)
+        if moves_on is None:
+            moves_on = self._moves_on[earlier] = self._moves_from(earlier)
+        skip = moves_on.intersection(allowed_actions)
+        self.stopovers += len(skip)
+        if back is not None and back not in skip and back in allowed_actions:
+            skip = skip | {back}
+            self.dominated += 1
+        return skip
+
+    @staticmethod
+    def _moves_from(stopovers):
+        """
+        Return the DRIVE and DIRECT FLIGHT actions that can be taken from one of the stopovers.
+        """
+        drives = {DRIVE_OFFSET + city for stopover in stopovers for city in NEIGHBORS[stopover]}
+        # A DIRECT FLIGHT is allowed to any city that is not the current one or next to it.
+        directs = {
+            DIRECT_OFFSET + city for city in range(N_CITIES)
+            if any(city != stopover and city not in NEIGHBORS[stopover] for stopover in stopovers)
+        }
+        return frozenset(drives | directs)
+
+    def stats(self):
+        """
+        Return the counters as a dict.
+        """
+        return {
+            "commuting": self.commuting,
+            "stopovers": self.stopovers,
+            "dominated": self.dominated,
+        }
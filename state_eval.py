@@ -1,4 +1,22 @@
-import networkx as nx
+from itertools import chain
+from operator import mul
+import numpy as np
+from topology import DISTANCES, DISTANCE_MATRIX, DISTANCE_TABLE, CITY_INDEX, CITY_COLORS, N_CITIES
+
+# Heuristic components, in the order evaluate_batch() returns them.
+H_COMPONENTS = ("h_dsurv", "h_dcure", "h_dshare", "h_cards", "h_disc", "h_inf", "h_cure")
+RESEARCH_STATION = CITY_INDEX["GENÈVE"]
+# Distances widened from int8, so that sums over the map do not overflow.
+_DISTANCES = DISTANCE_MATRIX.astype(np.int64)
+# h_cards term of a color, indexed by the most cards of that color held by a player.
+_CARD_DEFICIT = np.maximum(0, 4 - np.arange(N_CITIES + 1))
+# h_inf term of a city, indexed by its largest cube count: 0.5 if infected, 1.5 with 3 cubes.
+_INFECTION_LEVEL = np.array([0.0, 0.5, 0.5, 1.5])
+# Distance from every city to the nearer of two players, indexed by the players' city ids.
+_NEAREST = tuple(
+    tuple(tuple(min(row[a], row[b]) for row in DISTANCE_TABLE) for b in range(N_CITIES))
+    for a in range(N_CITIES)
+)
 
 class StateEvaluator:
     """
@@ -28,12 +46,10 @@ class StateEvaluator:
         #   (distance from player to city) * (total infection level in the city)
         
         for city in self.cities.keys():
-            city_infection = (
-                    self.cities[city].infection_red +
-                    self.cities[city].infection_blue +
-                    self.cities[city].infection_yellow
-                )
-            min_distance = min([nx.shortest_path_length(self.graph, city, player.loc.name) for player in self.players])
+            city_distances = DISTANCES[city]
+            cubes = self.cities[city].cubes
+            city_infection = cubes[2] + cubes[1] + cubes[0]
+            min_distance = min([city_distances[player.loc.name] for player in self.players])
             h_dsurv += min_distance * city_infection
             total_infection += city_infection
 
@@ -48,7 +64,7 @@ class StateEvaluator:
         """
         h_dcure = 0
         for player in self.players:
-            h_dcure += nx.shortest_path_length(self.graph, "GENÈVE", player.loc.name)
+            h_dcure += DISTANCES["GENÈVE"][player.loc.name]
         return h_dcure
     
     def h_dshare(self, target_city):
@@ -59,7 +75,7 @@ class StateEvaluator:
         """
         h_dshare = 0
         for player in self.players:
-            h_dshare += nx.shortest_path_length(self.graph, player.loc.name, target_city)
+            h_dshare += DISTANCES[player.loc.name][target_city]
         return h_dshare
         
 
@@ -70,15 +86,12 @@ class StateEvaluator:
         It finds the maximum number of cards of each color held by any player and computes the shortfall.
         """
         h_cards = 0
-        for color, cure_status in [("YELLOW", self.board.yellow_cure), 
-                                   ("BLUE", self.board.blue_cure), 
-                                   ("RED", self.board.red_cure)]:
+        for color, cure_status in enumerate((self.board.yellow_cure, self.board.blue_cure, self.board.red_cure)):
             if not cure_status:
                 # Determine the maximum number of cards of this disease color among all players.
                 max_cards = max(
-                    (sum(1 for card in player.hand if self.cities[card].color == color) 
-                     for player in self.players), 
-                    default=0  # In case no player holds any cards of that color.
+                    (player.color_counts[color] for player in self.players),
+                    default=0  # In case there are no players.
                 )
                 # Add the deficit (if any) required to reach 4 cards.
                 h_cards += max(0, 4 - max_cards)
@@ -91,14 +104,15 @@ class StateEvaluator:
         as these are no longer available to players.
         """
         h_disc = 0
+        discard_color_counts = self.board.discard_color_counts
         if not self.board.yellow_cure:
-            h_disc += len([card for card in self.board.player_discard_pile if self.cities[card].color == "YELLOW"])
+            h_disc += discard_color_counts[0]
 
         if not self.board.blue_cure:
-            h_disc += len([card for card in self.board.player_discard_pile if self.cities[card].color == "BLUE"])
+            h_disc += discard_color_counts[1]
 
         if not self.board.red_cure:
-            h_disc += len([card for card in self.board.player_discard_pile if self.cities[card].color == "RED"])
+            h_disc += discard_color_counts[2]
 
         return h_disc
 
@@ -109,17 +123,12 @@ class StateEvaluator:
         Higher values indicate a more severe outbreak.
         """
         h_inf = 0
-        for city in self.cities.keys():
-            if self.cities[city].infection_red == 3 or \
-                self.cities[city].infection_blue == 3 or \
-                self.cities[city].infection_yellow == 3:
-
+        for city in self.cities.values():
+            cubes = city.cubes
+            if cubes[2] == 3 or cubes[1] == 3 or cubes[0] == 3:
                 h_inf += 1.5
 
-            elif self.cities[city].infection_red or \
-                self.cities[city].infection_blue or \
-                self.cities[city].infection_yellow:
-
+            elif cubes[2] or cubes[1] or cubes[0]:
                 h_inf += 0.5
                 
         return h_inf
@@ -179,4 +188,332 @@ class StateEvaluator:
                "h_cure": round(h_cure, 2)})
         '''
 
-        return 0.5 * h_dsurv + 0.5 * h_dcure + 0.5 * h_dshare + h_cards + 1.5 * h_disc + 0.6 * h_inf + 24 * h_cure
\ No newline at end of file
+        return 0.5 * h_dsurv + 0.5 * h_dcure + 0.5 * h_dshare + h_cards + 1.5 * h_disc + 0.6 * h_inf + 24 * h_cure
+
+
+def evaluate_batch(goal, locs, cubes, color_counts, cures, discard_counts):
+    """
+    Compute h_state() for K candidate states at once.
+
+    The states are given as arrays, and every heuristic is computed for all of them with
+    NumPy operations against the distance matrix. The components are exact integers or halves,
+    and they are combined in the same order as h_state(), so the scores are identical.
+
+    Parameters:
+        goal (tuple): The goal, as for h_state().
+        locs (numpy.ndarray): [K, 2] city ids of player 1 and player 2.
+        cubes (numpy.ndarray): [K, 24, 3] cubes of each color in each city.
+        color_counts (numpy.ndarray): [K, 2, 3] cards of each color held by each player.
+        cures (numpy.ndarray): [K, 3] boolean, whether each cure has been found.
+        discard_counts (numpy.ndarray): [K, 3] discarded cards of each color.
+
+    Returns:
+        tuple: The [K] scores and a dict of the [K] arrays of each component in H_COMPONENTS.
+    """
+    treat_disease, share_knowledge, share_knowledge_location = goal
+    zeros = np.zeros(len(locs))
+
+    # Only the distance heuristic of the goal is computed; the other two are 0, as in h_state().
+    h_dsurv = h_dcure = h_dshare = zeros
+    if treat_disease:
+        h_dcure = h_goal = _DISTANCES[RESEARCH_STATION, locs].sum(axis=1)
+
+    elif share_knowledge:
+        h_dshare = h_goal = _DISTANCES[locs, CITY_INDEX[share_knowledge_location]].sum(axis=1)
+
+    else:
+        # Distance from each city to the nearest player, weighted by the cubes in the city.
+        infection = cubes.sum(axis=2)
+        min_distance = np.minimum(_DISTANCES[locs[:, 0]], _DISTANCES[locs[:, 1]])
+        total_infection = infection.sum(axis=1)
+        # With no cubes on the map the weighted sum is 0 too, so dividing by 1 gives 0.
+        h_dsurv = h_goal = (min_distance * infection).sum(axis=1) / np.maximum(total_infection, 1)
+
+    uncured = ~cures
+    h_cards = (_CARD_DEFICIT[color_counts.max(axis=1)] * uncured).sum(axis=1)
+    h_disc = (discard_counts * uncured).sum(axis=1)
+    h_inf = _INFECTION_LEVEL[cubes.max(axis=2)].sum(axis=1)
+    h_cure = uncured.sum(axis=1)
+
+    # Adding the two zero distance terms would not change any score.
+    scores = 0.5 * h_goal + h_cards + 1.5 * h_disc + 0.6 * h_inf + 24 * h_cure
+    components = dict(zip(H_COMPONENTS, (h_dsurv, h_dcure, h_dshare, h_cards, h_disc, h_inf, h_cure)))
+    return scores, components
+
+
+class StateBatch:
+    """
+    Collects candidate states reached from one game state, for evaluate_batch().
+
+    The search agents apply each candidate's actions in place, record the resulting state with
+    append() and undo the actions. Every candidate shares the cubes of the state the batch was
+    started from, except in the few cities its actions removed cubes from.
+    """
+
+    def __init__(self, board, players):
+        """
+        Parameters:
+            board (Board): The game board, in the state the candidates are reached from.
+            players (tuple): Player 1 and player 2.
+        """
+        self.board = board
+        self.players = players
+        self.base_cubes = np.fromiter(chain.from_iterable(board.cubes), np.int64, 3 * N_CITIES).reshape(N_CITIES, 3)
+        self.locs = []
+        self.color_counts = []
+        self.cures = []
+        self.discard_counts = []
+        self.cube_changes = []      # (row, city id, cubes of the city) for rows that differ.
+
+    def __len__(self):
+        return len(self.locs)
+
+    def append(self, city_ids=()):
+        """
+        Record the current game state as the next candidate.
+
+        Parameters:
+            city_ids (iterable): The cities whose cubes differ from the starting state.
+        """
+        board = self.board
+        player_1, player_2 = self.players
+        for city_id in city_ids:
+            self.cube_changes.append((len(self.locs), city_id, tuple(board.cubes[city_id])))
+        self.locs.append((CITY_INDEX[player_1.loc.name], CITY_INDEX[player_2.loc.name]))
+        self.color_counts.append((*player_1.color_counts, *player_2.color_counts))
+        self.cures.append((board.yellow_cure, board.blue_cure, board.red_cure))
+        self.discard_counts.append(board.discard_color_counts[:])
+
+    def evaluate(self, goal):
+        """
+        Evaluate every candidate recorded.
+
+        Returns:
+            tuple: The [K] scores and the per-component arrays, as evaluate_batch().
+        """
+        cubes = np.repeat(self.base_cubes[None], len(self.locs), axis=0)
+        for row, city_id, city_cubes in self.cube_changes:
+            cubes[row, city_id] = city_cubes
+        color_counts = np.array(self.color_counts).reshape(-1, 2, 3)
+        return evaluate_batch(goal, np.array(self.locs), cubes, color_counts,
+                              np.array(self.cures), np.array(self.discard_counts))
+
+
+class IncrementalEvaluator:
+    """
+    Computes h_state() for a game that a search changes in place, one action at a time.
+
+    The sums over the whole map are kept up to date instead of being recomputed: the cubes in
+    each city, the infected cities and the cities with 3 cubes of a color, and the infection
+    weighted by the distance to the nearest player. Each apply() updates them for the city and
+    the player the action changed, and undo() restores them. The weighted infection is only
+    needed for the survival goal, so after a move it is recomputed on the next evaluate() that
+    reads it. The other heuristics only read a few counters. Values are identical to h_state().
+
+    Usage, after reset() at the root of a search and around its in-place
+    take_action()/undo_action():
+
+        record = player.take_action(action, board, cities)
+        evaluator.apply(player, record)
+        ...
+        evaluator.undo()
+        player.undo_action(record, board, cities)
+    """
+
+    def __init__(self, env):
+        """
+        Parameters:
+            env (PandemicEnv): The game evaluated.
+        """
+        self.env = env
+        self._stack = []
+
+    def reset(self):
+        """
+        Recompute the running sums from the current state of the game.
+
+        Call it whenever the game changed other than through apply()/undo(), e.g. at the root
+        of every search.
+        """
+        env = self.env
+        self.board = env.board
+        self.player_1, self.player_2 = env.player_1, env.player_2
+        self.infection = [sum(cubes) for cubes in self.board.cubes]   # Cubes in each city.
+        self.levels = [max(cubes) for cubes in self.board.cubes]      # Largest cube count of each city.
+        self.total_infection = sum(self.infection)
+        self.n_infected = sum(1 for level in self.levels if level)
+        self.n_three = self.levels.count(3)
+        self.locs = (CITY_INDEX[self.player_1.loc.name], CITY_INDEX[self.player_2.loc.name])
+        self.weighted = None    # Distance-weighted infection, None until needed after a move.
+        self._stack = []
+
+    def apply(self, player, record):
+        """
+        Update the sums for an action just taken.
+
+        Parameters:
+            player (Player): The player that took the action.
+            record (tuple): The undo record returned by player.take_action().
+        """
+        locs = self.locs
+        cubes_removed = record[5]
+        if cubes_removed:
+            city = CITY_INDEX[player.loc.name]
+            infection, level = self.infection[city], self.levels[city]
+            self._stack.append((locs, self.weighted, self.total_infection, self.n_infected, self.n_three,
+                                city, infection, level))
+            new_level = max(player.loc.cubes)
+            self.infection[city] = infection - cubes_removed
+            self.levels[city] = new_level
+            self.total_infection -= cubes_removed
+            self.n_infected -= (level > 0) - (new_level > 0)
+            self.n_three -= (level == 3) - (new_level == 3)
+            if self.weighted is not None:
+                self.weighted -= _NEAREST[locs[0]][locs[1]][city] * cubes_removed
+        else:
+            self._stack.append((locs, self.weighted, self.total_infection, self.n_infected, self.n_three,
+                                None, 0, 0))
+
+        if player.loc is not record[1]:
+            loc = CITY_INDEX[player.loc.name]
+            self.locs = (loc, locs[1]) if player is self.player_1 else (locs[0], loc)
+            self.weighted = None
+
+    def undo(self):
+        """
+        Restore the sums from before the last applied action.
+        """
+        (self.locs, self.weighted, self.total_infection, self.n_infected, self.n_three,
+         city, infection, level) = self._stack.pop()
+        if city is not None:
+            self.infection[city] = infection
+            self.levels[city] = level
+
+    def evaluate(self, goal):
+        """
+        Return h_state(goal) of the current state.
+        """
+        treat_disease, share_knowledge, share_knowledge_location = goal
+        board = self.board
+        loc_1, loc_2 = self.locs
+
+        h_dsurv = h_dcure = h_dshare = 0
+        if treat_disease:
+            research_station = DISTANCE_TABLE[RESEARCH_STATION]
+            h_dcure = research_station[loc_1] + research_station[loc_2]
+        elif share_knowledge:
+            target = DISTANCE_TABLE[CITY_INDEX[share_knowledge_location]]
+            h_dshare = target[loc_1] + target[loc_2]
+        elif self.total_infection:
+            if self.weighted is None:
+                self.weighted = sum(map(mul, _NEAREST[loc_1][loc_2], self.infection))
+            h_dsurv = self.weighted / self.total_infection
+
+        # Card deficit, discarded cards and missing cure of each uncured color.
+        h_cards = h_disc = h_cure = 0
+        counts_1, counts_2 = self.player_1.color_counts, self.player_2.color_counts
+        discard_color_counts = board.discard_color_counts
+        for color, cure_status in enumerate((board.yellow_cure, board.blue_cure, board.red_cure)):
+            if not cure_status:
+                most = counts_1[color] if counts_1[color] > counts_2[color] else counts_2[color]
+                if most < 4:
+                    h_cards += 4 - most
+                h_disc += discard_color_counts[color]
+                h_cure += 1
+        # 0.5 per infected city, plus 1 more (1.5 in all) per city with 3 cubes of a color.
+        h_inf = 0.5 * self.n_infected + self.n_three
+
+        return 0.5 * h_dsurv + 0.5 * h_dcure + 0.5 * h_dshare + h_cards + 1.5 * h_disc + 0.6 * h_inf + 24 * h_cure
+
+    def lower_bound(self, goal, player, actions):
+        """
+        Return a value that h_state(goal) cannot go below within the given number of actions.
+
+        Only the given player acts, so each term is bounded by how far their actions can move
+        it. Cubes never increase and an action removes cubes in one city only. Discards only
+        grow, by one card per flight. Cards only change hands by SHARE at the partner's city,
+        so the most cards of a color held grows by at most 1. A cure takes a FIND CURE at the
+        research station with 4 cards of its color. The survival distance is bounded by 0.
+
+        Parameters:
+            goal (tuple): The goal of the search.
+            player (Player): The player taking the actions.
+            actions (int): The actions left.
+
+        Returns:
+            float: The lower bound.
+        """
+        treat_disease, share_knowledge, share_knowledge_location = goal
+        board = self.board
+        partner = player.partner
+        if player is self.player_1:
+            loc, partner_loc = self.locs
+        else:
+            partner_loc, loc = self.locs
+        cures = (board.yellow_cure, board.blue_cure, board.red_cure)
+
+        # The card that can be shared, at the partner's city, and whether the player receives it.
+        partner_city = partner.loc.name
+        shared_color = CITY_COLORS[partner_loc]
+        receives = partner_city in partner.hand
+        can_share = receives or partner_city in player.hand
+
+        # Each uncured color costs 24, plus its card deficit and discards, unless it can be cured.
+        spare = actions - 1 - (loc != RESEARCH_STATION)     # Actions left around a FIND CURE.
+        counts, partner_counts = player.color_counts, partner.color_counts
+        discard_color_counts = board.discard_color_counts
+        h_colors = 0
+        curable = False
+        for color in range(3):
+            if cures[color]:
+                continue
+            shared = color == shared_color
+            if spare >= 0 and counts[color] + (shared and receives and spare >= 1) >= 4:
+                curable = True
+                continue
+            most = counts[color] if counts[color] > partner_counts[color] else partner_counts[color]
+            most += shared and can_share
+            h_colors += (4 - most if most < 4 else 0) + 1.5 * discard_color_counts[color] + 24
+
+        # The player's distance to the target: driving there, or flying, which discards a card
+        # that counts while no color is or can be cured.
+        h_dist = 0
+        if treat_disease or share_knowledge:
+            target = RESEARCH_STATION if treat_disease else CITY_INDEX[share_knowledge_location]
+            distances = DISTANCE_TABLE[target]
+            driving = max(0, distances[loc] - actions)
+            flying = max(0, self._actions_to(target, player, loc, partner_loc) - actions)
+            flight_cost = 0 if curable or any(cures) else 3   # 1.5 discard, as half a distance.
+            h_dist = distances[partner_loc] + min(driving, flying + flight_cost)
+
+        # An action lowers h_inf by at most 1 (a city losing its third cube), or 1.5 when a
+        # treatment of a cured color clears a city.
+        step = 1.5 if curable or any(cures) else 1.0
+        h_inf = max(0.0, 0.5 * self.n_infected + self.n_three - step * actions)
+
+        return 0.5 * h_dist + h_colors + 0.6 * h_inf
+
+    @staticmethod
+    def _actions_to(target, player, loc, partner_loc):
+        """
+        Return a lower bound on the actions the player, in city loc, needs to reach the target.
+        """
+        distances = DISTANCE_TABLE[target]
+        fewest = distances[loc]
+        if fewest <= 1:
+            return fewest
+        hand = player.hand
+        if hand:
+            # A CHARTER FLIGHT from here, or from the city of another card, reached first.
+            fewest = 1 if player.loc.name in hand else 2
+            # A DIRECT FLIGHT to a card's city, then DRIVEs.
+            for card in hand:
+                moves = 1 + distances[CITY_INDEX[card]]
+                if moves < fewest:
+                    fewest = moves
+        if player.partner.loc.name in player.partner.hand:
+            # SHARE the card of the partner's city there, then a CHARTER FLIGHT.
+            share = 2 if partner_loc == loc else 3
+            if share < fewest:
+                fewest = share
+        return fewest
@@ -0,0 +1,311 @@
+import ctypes
+import multiprocessing as mp
+import os
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from actions import N_ACTIONS
+from observation import OBS_SIZE
+
+
+def _as_array(raw, dtype, shape):
+    """
+    View a multiprocessing RawArray as a NumPy array, without copying.
+    """
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _shared_arrays(buffers, num_envs):
+    """
+    Wrap the shared buffers of a SharedMemoryVecEnv as NumPy arrays.
+
+    Returns:
+        tuple: Observations, terminal observations, action masks, rewards, dones and actions.
+    """
+    return (
+        _as_array(buffers["obs"], np.float32, (num_envs, OBS_SIZE)),
+        _as_array(buffers["terminal_obs"], np.float32, (num_envs, OBS_SIZE)),
+        _as_array(buffers["masks"], np.bool_, (num_envs, N_ACTIONS)),
+        _as_array(buffers["rewards"], np.float32, (num_envs,)),
+        _as_array(buffers["dones"], np.bool_, (num_envs,)),
+        _as_array(buffers["actions"], np.int64, (num_envs,)),
+    )
+
+
+def _worker(remote, parent_remote, indices, buffers, num_envs):
+    """
+    Run a block of PandemicEnv games in a worker process.
+
+    Observations, masks, rewards and dones are written straight into the shared buffers at the
+    games' own rows, and actions are read from there. Only commands and the small info dicts
+    travel through the pipe.
+
+    Parameters:
+        remote: The worker end of the pipe.
+        parent_remote: The main process end of the pipe, closed in the worker.
+        indices (list): The global indices of the games run by this worker.
+        buffers (dict): The shared RawArrays created by SharedMemoryVecEnv.
+        num_envs (int): The total number of games.
+    """
+    # The environment is imported here so that the main process does not need it.
+    from env import PandemicEnv
+
+    parent_remote.close()
+    obs, terminal_obs, masks, rewards, dones, actions = _shared_arrays(buffers, num_envs)
+    envs = [PandemicEnv() for _ in indices]
+
+    while True:
+        try:
+            command, data = remote.recv()
+        except EOFError:
+            break
+
+        try:
+            if command == "step":
+                infos = []
+                for idx, env in zip(indices, envs):
+                    observation, reward, terminated, truncated, info = env.step(int(actions[idx]))
+                    mask = info.pop("action_mask")
+                    done = terminated or truncated
+                    if done:
+                        # Keep the last observation and start the next game right away.
+                        terminal_obs[idx] = observation
+                        info["TimeLimit.truncated"] = truncated and not terminated
+                        observation, reset_info = env.reset()
+                        mask = reset_info["action_mask"]
+                    obs[idx] = observation
+                    masks[idx] = mask
+                    rewards[idx] = reward
+                    dones[idx] = done
+                    infos.append(info)
+                remote.send(infos)
+
+            elif command == "reset":
+                for idx, env, seed in zip(indices, envs, data):
+                    observation, info = env.reset(seed=seed)
+                    obs[idx] = observation
+                    masks[idx] = info["action_mask"]
+                remote.send(None)
+
+            elif command == "get_attr":
+                attr_name, local_indices = data
+                remote.send([getattr(envs[i], attr_name) for i in local_indices])
+
+            elif command == "set_attr":
+                attr_name, value, local_indices = data
+                for i in local_indices:
+                    setattr(envs[i], attr_name, value)
+                remote.send(None)
+
+            elif command == "env_method":
+                method_name, args, kwargs, local_indices = data
+                remote.send([getattr(envs[i], method_name)(*args, **kwargs) for i in local_indices])
+
+            elif command == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+
+            else:
+                raise NotImplementedError(f"Unknown command {command!r}")
+
+        except Exception as error:
+            # Hand the error to the main process, which raises it.
+            remote.send(error)
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Runs PandemicEnv games in worker processes, exchanging observations, masks, rewards and
+    actions through shared memory instead of pickling them through pipes.
+
+    The num_envs games are split into contiguous blocks, one per worker process. Games that end
+    are reset automatically by their worker and their last observation is returned in
+    info["terminal_observation"], as SB3 expects. action_masks() is served from shared memory,
+    so MaskablePPO does not need the ActionMasker wrapper.
+    """
+
+    def __init__(self, num_envs, n_workers=None, seed=None, start_method=None):
+        """
+        Parameters:
+            num_envs (int): The number of games played at once.
+            n_workers (int or None): The number of worker processes. Defaults to one per core,
+                at most one per game.
+            seed (int or None): Seed of the first game; game i is seeded with seed + i.
+            start_method (str or None): The multiprocessing start method. Defaults to forkserver
+                where available and spawn otherwise, as SubprocVecEnv does.
+        """
+        self.render_mode = None
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = max(1, min(n_workers, num_envs))
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # Shared buffers, one row per game.
+        self._buffers = {
+            "obs": ctx.RawArray(ctypes.c_float, num_envs * OBS_SIZE),
+            "terminal_obs": ctx.RawArray(ctypes.c_float, num_envs * OBS_SIZE),
+            "masks": ctx.RawArray(ctypes.c_bool, num_envs * N_ACTIONS),
+            "rewards": ctx.RawArray(ctypes.c_float, num_envs),
+            "dones": ctx.RawArray(ctypes.c_bool, num_envs),
+            "actions": ctx.RawArray(ctypes.c_int64, num_envs),
+        }
+        (self._obs, self._terminal_obs, self._masks,
+         self._rewards, self._dones, self._actions) = _shared_arrays(self._buffers, num_envs)
+
+        # Contiguous blocks of games, one per worker.
+        self._blocks = [block.tolist() for block in np.array_split(np.arange(num_envs), n_workers)]
+        self._worker_of = np.repeat(np.arange(n_workers), [len(block) for block in self._blocks])
+
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for work_remote, remote, block in zip(work_remotes, self.remotes, self._blocks):
+            args = (work_remote, remote, block, self._buffers, num_envs)
+            # daemon=True: workers must not outlive a crashed main process.
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.waiting = False
+        self.closed = False
+
+        super().__init__(num_envs, spaces.Box(low=0, high=1, shape=(OBS_SIZE,), dtype=np.float32),
+                         spaces.Discrete(N_ACTIONS))
+        if seed is not None:
+            self.seed(seed)
+
+    # ------------------------------------------------------------------
+    # VecEnv interface
+    # ------------------------------------------------------------------
+
+    def reset(self):
+        """
+        Reset every game, using the seeds set by seed() if any.
+
+        Returns:
+            numpy.ndarray: The [N, 849] observations.
+        """
+        for remote, block in zip(self.remotes, self._blocks):
+            remote.send(("reset", [self._seeds[idx] for idx in block]))
+        self._receive_all()
+        self._reset_seeds()
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        self._actions[:] = actions
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait for the workers to apply the pending actions.
+
+        Returns:
+            tuple: Observations [N, 849], rewards [N], dones [N] and a list of info dicts.
+        """
+        infos = [info for block_infos in self._receive_all() for info in block_infos]
+        self.waiting = False
+
+        dones = self._dones.copy()
+        for idx in np.flatnonzero(dones):
+            infos[idx]["terminal_observation"] = self._terminal_obs[idx].copy()
+        return self._obs.copy(), self._rewards.copy(), dones, infos
+
+    def action_masks(self):
+        """
+        Return the valid action masks of all games.
+
+        Returns:
+            numpy.ndarray: Boolean [N, 79] array.
+        """
+        return self._masks.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self._receive_all()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def has_attr(self, attr_name):
+        # action_masks() lives here rather than on the workers' PandemicEnv games.
+        return hasattr(self, attr_name) or super().has_attr(attr_name)
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call_workers("get_attr", lambda local: (attr_name, local), indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call_workers("set_attr", lambda local: (attr_name, value, local), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks":
+            return list(self._masks[self._get_indices(indices)])
+        return self._call_workers("env_method", lambda local: (method_name, method_args, method_kwargs, local), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._get_indices(indices))
+
+    def _get_indices(self, indices):
+        return list(super()._get_indices(indices))
+
+    # ------------------------------------------------------------------
+    # Worker communication
+    # ------------------------------------------------------------------
+
+    def _receive_all(self):
+        """
+        Collect one reply from every worker, raising any error a worker reported.
+        """
+        replies = [remote.recv() for remote in self.remotes]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def _call_workers(self, command, make_data, indices):
+        """
+        Send a command to the workers running the given games and return the per-game results.
+
+        Parameters:
+            command (str): The worker command.
+            make_data (callable): Builds the command data from the worker-local game indices.
+            indices (None, int or iterable): The games to address.
+
+        Returns:
+            list or None: The results, in the order of the requested games.
+        """
+        indices = self._get_indices(indices)
+        requests = {}
+        for idx in indices:
+            worker = int(self._worker_of[idx])
+            requests.setdefault(worker, []).append(self._blocks[worker].index(idx))
+
+        for worker, local_indices in requests.items():
+            self.remotes[worker].send((command, make_data(local_indices)))
+        replies = {}
+        for worker in requests:
+            reply = self.remotes[worker].recv()
+            if isinstance(reply, Exception):
+                raise reply
+            replies[worker] = reply
+        if command == "set_attr":
+            return None
+
+        # Reassemble the per-worker results in the requested order.
+        results = []
+        positions = {worker: 0 for worker in requests}
+        for idx in indices:
+            worker = int(self._worker_of[idx])
+            results.append(replies[worker][positions[worker]])
+            positions[worker] += 1
+        return results
@@ -0,0 +1,96 @@
+import json
+import time
+
+# Phases of PandemicEnv.step(), in the order they run.
+STEP_PHASES = (
+    "cure_prob",        # Cure probability scan before the action.
+    "take_action",      # Applying the action to the players and board.
+    "reward",           # Reward shaping.
+    "draw_cards",       # Player deck draw at the end of a turn.
+    "infect",           # Infection deck draw and outbreaks at the end of a turn.
+    "goal",             # Goal selection for the next player.
+    "discard",          # Discard selection for hands above 6 cards.
+    "observation",      # Observation encoding.
+    "action_mask",      # Action mask for the next state.
+)
+(CURE_PROB, TAKE_ACTION, REWARD, DRAW_CARDS, INFECT,
+ GOAL, DISCARD, OBSERVATION, ACTION_MASK) = range(len(STEP_PHASES))
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time and call counts per phase.
+
+    Phases are identified by their index, and the totals are kept in flat lists, so recording a
+    phase allocates nothing. Timed code keeps a running timestamp and hands it to add(), which
+    returns the timestamp to use for the next phase:
+
+        start = time.perf_counter()
+        ...
+        start = timer.add(TAKE_ACTION, start)
+    """
+
+    def __init__(self, phases=STEP_PHASES):
+        """
+        Parameters:
+            phases (tuple): The phase names, indexed by phase id.
+        """
+        self.phases = tuple(phases)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all totals and counts.
+        """
+        self.totals = [0.0] * len(self.phases)
+        self.counts = [0] * len(self.phases)
+
+    def add(self, phase, start):
+        """
+        Record the time elapsed since start for a phase.
+
+        Parameters:
+            phase (int): The phase id.
+            start (float): The time.perf_counter() value the phase started at.
+
+        Returns:
+            float: The current time.perf_counter() value.
+        """
+        now = time.perf_counter()
+        self.totals[phase] += now - start
+        self.counts[phase] += 1
+        return now
+
+    def as_dict(self):
+        """
+        Return the totals as {phase: {"seconds": ..., "calls": ..., "mean_us": ...}}.
+        """
+        return {
+            name: {
+                "seconds": total,
+                "calls": count,
+                "mean_us": 1e6 * total / count if count else 0.0,
+            }
+            for name, total, count in zip(self.phases, self.totals, self.counts)
+        }
+
+    def summary(self):
+        """
+        Return a human-readable table of the phases, sorted by total time.
+        """
+        grand_total = sum(self.totals) or 1.0
+        lines = [f"{'phase':<14}{'calls':>10}{'total s':>12}{'mean us':>12}{'share':>8}"]
+        for name, stats in sorted(self.as_dict().items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"{name:<14}{stats['calls']:>10}{stats['seconds']:>12.4f}"
+                         f"{stats['mean_us']:>12.1f}{stats['seconds'] / grand_total:>8.1%}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """
+        Write the totals to a JSON file.
+
+        Parameters:
+            path (str): The file to write.
+        """
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
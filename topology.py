@@ -0,0 +1,77 @@
+import networkx as nx
+import numpy as np
+from constants import CITIES, COLORS
+
+# Fixed ordering of the cities, matching the order of constants.CITIES.
+# City ids used throughout the engine are indices into this tuple.
+CITY_NAMES = tuple(CITIES.keys())
+CITY_INDEX = {name: idx for idx, name in enumerate(CITY_NAMES)}
+N_CITIES = len(CITY_NAMES)
+
+# Disease colors in the same order as City.color_encoder.
+COLOR_NAMES = ("YELLOW", "BLUE", "RED")
+COLOR_INDEX = {color: idx for idx, color in enumerate(COLOR_NAMES)}
+CITY_COLORS = tuple(COLOR_INDEX[COLORS[name]] for name in CITY_NAMES)
+# Color id of each city (card) by name.
+CARD_COLORS = dict(zip(CITY_NAMES, CITY_COLORS))
+
+
+def create_graph():
+    """
+    Create the (frozen) network graph of the cities based on their connections.
+
+    Returns:
+        networkx.Graph: A graph with cities as nodes and connections as edges.
+    """
+    graph = nx.Graph()
+    for city in CITIES.keys():
+        for neighbor in CITIES[city]:
+            graph.add_edge(city, neighbor)
+    return nx.freeze(graph)
+
+
+def create_distance_matrix(graph):
+    """
+    Compute the all-pairs shortest path lengths of the city graph.
+
+    Parameters:
+        graph (networkx.Graph): The city graph.
+
+    Returns:
+        numpy.ndarray: A read-only [N_CITIES, N_CITIES] int8 matrix indexed by city id.
+    """
+    matrix = np.zeros((N_CITIES, N_CITIES), dtype=np.int8)
+    for source, lengths in nx.all_pairs_shortest_path_length(graph):
+        for target, length in lengths.items():
+            matrix[CITY_INDEX[source], CITY_INDEX[target]] = length
+    matrix.setflags(write=False)
+    return matrix
+
+
+GRAPH = create_graph()
+
+# Neighbor city ids of every city, in the order given by constants.CITIES.
+NEIGHBORS = tuple(tuple(CITY_INDEX[neighbor] for neighbor in CITIES[name]) for name in CITY_NAMES)
+
+# All-pairs distances, as an array for vectorized code and as nested tuples/dicts
+# for scalar lookups (indexing a numpy array element by element is much slower).
+DISTANCE_MATRIX = create_distance_matrix(GRAPH)
+DISTANCE_TABLE = tuple(tuple(int(d) for d in row) for row in DISTANCE_MATRIX)
+DISTANCES = {
+    source: {target: DISTANCE_TABLE[i][j] for j, target in enumerate(CITY_NAMES)}
+    for i, source in enumerate(CITY_NAMES)
+}
+
+
+def distance(source, target):
+    """
+    Return the number of DRIVE moves between two cities.
+
+    Parameters:
+        source (str): Name of the first city.
+        target (str): Name of the second city.
+
+    Returns:
+        int: The shortest path length between the two cities.
+    """
+    return DISTANCES[source][target]
@@ -0,0 +1,214 @@
+"""
+Zobrist hashing of game states and a bounded transposition table for the search agents.
+
+Both agents search by applying actions in place and undoing them, so the hash of a child state
+is derived from its parent's hash and the undo record of the action that produced it, instead
+of being recomputed from the whole board.
+"""
+from collections import OrderedDict
+import numpy as np
+from actions import ACTIONS, DIRECT, CHARTER, SHARE, FIND
+from player import CURE_ATTRS
+from topology import CITY_INDEX, CITY_NAMES, N_CITIES, CARD_COLORS
+
+DEFAULT_TT_SIZE = 200_000   # Entries kept by a TranspositionTable before evicting.
+_MAX_CUBES = 3              # Cubes of one color a city can hold.
+_MAX_DISCARDS = 24          # Upper bound on the discarded cards of one color.
+
+
+class ZobristHasher:
+    """
+    Zobrist keys for the parts of the game state the search reads.
+
+    The hashed state is: both players' locations, both players' cards (as sets), the cubes of
+    every color in every city, the cures found, the number of discarded cards of each color
+    (all that the heuristics read of the discard pile) and whose turn it is. The cube supply is
+    left out: within a search it only changes together with the cubes on the map.
+    """
+
+    def __init__(self, seed=0):
+        """
+        Parameters:
+            seed (int): Seed of the random keys. The keys only need to be fixed for the life of
+                the table, so any seed works.
+        """
+        rng = np.random.default_rng(seed)
+
+        def keys(*shape):
+            return rng.integers(0, 2**63, size=shape, dtype=np.int64).tolist()
+
+        self.location = keys(2, N_CITIES)                            # [player][city]
+        self.card = [dict(zip(CITY_NAMES, row)) for row in keys(2, N_CITIES)]  # [player][card]
+        self.cubes = keys(N_CITIES, 3, _MAX_CUBES + 1)               # [city][color][count]
+        self.cure = keys(3)                                          # [color]
+        self.discard = keys(3, _MAX_DISCARDS + 1)                    # [color][count]
+        self.turn = keys(1)[0]                                       # Set when player 2 is to move.
+        self._goals = {}
+        self._rng = rng
+
+    def goal_key(self, goal):
+        """
+        Return the key mixed into the hashes of a search run towards the given goal.
+
+        Heuristic values depend on the goal as well as on the state, so entries stored for one
+        goal must not be found when searching for another.
+
+        Parameters:
+            goal (tuple): The goal returned by goals.plan_goal().
+        """
+        key = self._goals.get(goal)
+        if key is None:
+            key = self._goals[goal] = int(self._rng.integers(0, 2**63))
+        return key
+
+    def hash_state(self, env):
+        """
+        Compute the hash of the current state of env from scratch.
+        """
+        board = env.board
+        h = 0
+        for p, player in enumerate((env.player_1, env.player_2)):
+            h ^= self.location[p][CITY_INDEX[player.loc.name]]
+            for card in player.hand:
+                h ^= self.card[p][card]
+        for name, city in env.cities.items():
+            city_keys = self.cubes[CITY_INDEX[name]]
+            for color in range(3):
+                h ^= city_keys[color][city.cubes[color]]
+        for color in range(3):
+            if getattr(board, CURE_ATTRS[color]):
+                h ^= self.cure[color]
+            h ^= self.discard[color][board.discard_color_counts[color]]
+        if env.current_player is env.player_2:
+            h ^= self.turn
+        return h
+
+    def update(self, h, player, record, board):
+        """
+        Return the hash of the state reached by an action, given the hash before it.
+
+        Parameters:
+            h (int): The hash of the state the action was taken in.
+            player (Player): The player that took the action.
+            record (tuple): The undo record returned by player.take_action().
+            board (Board): The game board, in the state after the action.
+
+        Returns:
+            int: The hash of the state after the action.
+        """
+        action, prev_loc, giver, _, cube_color, cubes_removed, previous_hand = record
+        kind, _, color = ACTIONS[action]
+        p = player.id - 1
+        loc = player.loc
+
+        if loc is not prev_loc:
+            location_keys = self.location[p]
+            h ^= location_keys[CITY_INDEX[prev_loc.name]] ^ location_keys[CITY_INDEX[loc.name]]
+        if cubes_removed:
+            cube_keys = self.cubes[CITY_INDEX[loc.name]][cube_color]
+            now = loc.cubes[cube_color]
+            h ^= cube_keys[now + cubes_removed] ^ cube_keys[now]
+
+        if kind == DIRECT or kind == CHARTER:
+            # DIRECT spends the destination card, CHARTER the card of the city left. Both put
+            # the destination card on the discard pile.
+            h ^= self.card[p][loc.name if kind == DIRECT else prev_loc.name]
+            discarded = CARD_COLORS[loc.name]
+            count = board.discard_color_counts[discarded]
+            h ^= self.discard[discarded][count - 1] ^ self.discard[discarded][count]
+
+        elif kind == SHARE:
+            g = giver.id - 1
+            h ^= self.card[g][loc.name] ^ self.card[1 - g][loc.name]
+
+        elif kind == FIND:
+            h ^= self.cure[color]
+            card_keys = self.card[p]
+            hand = player.hand
+            for card in previous_hand:
+                if card not in hand:
+                    h ^= card_keys[card]
+            count = board.discard_color_counts[color]
+            removed = len(previous_hand) - len(hand)
+            h ^= self.discard[color][count - removed] ^ self.discard[color][count]
+
+        return h
+
+
+class TranspositionTable:
+    """
+    A bounded map from search keys to results, evicting the least recently used entry when full.
+
+    Hits, misses and evictions are counted so the reuse a search gets can be reported.
+    """
+
+    def __init__(self, capacity=DEFAULT_TT_SIZE):
+        """
+        Parameters:
+            capacity (int): The maximum number of entries kept. 0 disables the table: nothing is
+                stored and every lookup misses.
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Clear the hit, miss, store and eviction counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def clear(self):
+        """
+        Drop every entry, keeping the counters.
+        """
+        self.entries.clear()
+
+    def get(self, key):
+        """
+        Return the entry stored under key, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store an entry under key, evicting the least recently used entry if the table is full.
+        """
+        if not self.capacity:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.stores += 1
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Return the counters as a dict.
+        """
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
@@ -1,8 +1,8 @@
 from env import PandemicEnv
 
 for _ in range(100):
-    env = PandemicEnv()
-    obs, _ = env.reset()
+    env = PandemicEnv(render_mode="human")
+    obs, info = env.reset()
     action_space = env.players[0].all_actions
     terminated = False
     env.render()
@@ -11,8 +11,8 @@ for _ in range(100):
         action = str(input("Enter action: ").strip().upper())
         action_idx = action_space.index(action)
         print(action_idx)
-        print(env.valid_action_mask())
-        if env.valid_action_mask()[action_idx]:  # Check if action is valid
+        print(info["action_mask"])
+        if info["action_mask"][action_idx]:  # Check if action is valid
             print(env.current_player.id, env.current_player.all_actions[action_idx])
             obs, reward, terminated, truncated, info = env.step(action_idx)
             print("--------------------")
@@ -0,0 +1,533 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from topology import CITY_INDEX, CITY_COLORS, NEIGHBORS, N_CITIES, DISTANCE_MATRIX, DISTANCE_TABLE
+from observation import (OBS_SIZE, CITY_FEATURES, GLOBALS_OFFSET, SHARE_SLOT, COLOR_SLOT, CUBE_SLOTS,
+                         HAND_SLOTS, LOCATION_SLOTS, INFECTION_DISCARD_SLOT, PLAYER_DISCARD_SLOT, DISTANCE_SLOT)
+from discard import optimal_discard_splits
+from actions import (DIRECT, CHARTER, TREAT, SHARE, FIND, N_ACTIONS,
+                     ACTION_KIND, ACTION_TARGET, ACTION_COLOR)
+
+N_COLORS = 3
+RESEARCH_STATION = CITY_INDEX["GENÈVE"]
+CONTAINMENT_PLAYER = 0      # Player 1 (Containment Specialist) removes a cube when entering a city.
+QUARANTINE_PLAYER = 1       # Player 2 (Quarantine Specialist) protects their city and its neighbors.
+INFECTION_RATE = 2          # The player deck holds no Epidemic cards, so the rate never increases.
+INITIAL_CUBES = 16
+MAX_HAND_SIZE = 6
+
+CITY_COLOR = np.array(CITY_COLORS, dtype=np.int8)
+COLOR_ONEHOT = np.eye(N_COLORS, dtype=np.int8)[CITY_COLOR]          # [city, color]
+CITY_BITS = np.int32(1) << np.arange(N_CITIES, dtype=np.int32)       # [city]
+COLOR_BITS = tuple(int(CITY_BITS[CITY_COLOR == color].sum()) for color in range(N_COLORS))
+ADJACENT = np.zeros((N_CITIES, N_CITIES), dtype=bool)
+for _city, _neighbors in enumerate(NEIGHBORS):
+    ADJACENT[_city, list(_neighbors)] = True
+ADJACENT_OR_SELF = ADJACENT | np.eye(N_CITIES, dtype=bool)
+
+
+def hand_cards(hands):
+    """
+    Expand hand bitmasks into boolean card membership arrays.
+
+    Parameters:
+        hands (numpy.ndarray): Integer bitmasks of any shape.
+
+    Returns:
+        numpy.ndarray: Boolean array with a trailing city axis.
+    """
+    return (hands[..., None] & CITY_BITS) != 0
+
+
+def hand_color_counts(hands):
+    """
+    Count the cards of each color in hand bitmasks.
+
+    Parameters:
+        hands (numpy.ndarray): Integer bitmasks of any shape.
+
+    Returns:
+        numpy.ndarray: Card counts with a trailing color axis.
+    """
+    return hand_cards(hands).astype(np.int8) @ COLOR_ONEHOT
+
+
+class PandemicVecEnv(VecEnv):
+    """
+    Vectorized Pandemic environment that plays N games at once with struct-of-arrays NumPy state.
+
+    The rules, rewards and observation layout follow PandemicEnv. Cubes are stored as [N, 24, 3],
+    hands as one 24-bit mask per player, and the player and infection decks as index arrays that
+    are drawn from the end. Games that end are reset automatically and their last observation is
+    returned in info["terminal_observation"], as SB3 expects.
+    """
+
+    def __init__(self, num_envs, seed=None):
+        self.render_mode = None
+        n = num_envs
+        self._games = np.arange(n)
+
+        # Board state.
+        self.cubes = np.zeros((n, N_CITIES, N_COLORS), dtype=np.int8)
+        self.cube_supply = np.zeros((n, N_COLORS), dtype=np.int16)
+        self.cures = np.zeros((n, N_COLORS), dtype=bool)
+        self.outbreak_count = np.zeros(n, dtype=np.int16)
+        self.player_deck = np.zeros((n, N_CITIES - 6), dtype=np.int8)
+        self.player_deck_size = np.zeros(n, dtype=np.int16)
+        self.infection_deck = np.zeros((n, N_CITIES), dtype=np.int8)
+        self.infection_deck_size = np.zeros(n, dtype=np.int16)
+        self.infection_discard = np.zeros((n, N_CITIES), dtype=bool)
+        self.player_discard = np.zeros((n, N_CITIES), dtype=bool)
+
+        # Player state, indexed [game, player].
+        self.hands = np.zeros((n, 2), dtype=np.int32)
+        self.locations = np.zeros((n, 2), dtype=np.int8)
+
+        # Turn state.
+        self.current_player = np.zeros(n, dtype=np.int8)
+        self.actions_taken = np.zeros(n, dtype=np.int8)
+        self.game_round = np.zeros(n, dtype=np.int16)
+        self.goal_find_cure = np.zeros(n, dtype=bool)
+        self.goal_share_location = np.full(n, -1, dtype=np.int8)
+        self.high_cure_prob = np.zeros((n, N_COLORS), dtype=np.float64)
+
+        # Observation buffer with the static block written once.
+        self._obs = np.zeros((n, OBS_SIZE), dtype=np.float32)
+        self._city_block = self._obs[:, :GLOBALS_OFFSET].reshape(n, N_CITIES, CITY_FEATURES)
+        self._city_block[:, :, COLOR_SLOT] = CITY_COLOR / 2
+        self._city_block[:, :, DISTANCE_SLOT:] = DISTANCE_MATRIX / 8
+        self._masks = np.zeros((n, N_ACTIONS), dtype=bool)
+
+        self._rngs = [None] * n
+        self._actions = None
+
+        super().__init__(n, spaces.Box(low=0, high=1, shape=(OBS_SIZE,), dtype=np.float32),
+                         spaces.Discrete(N_ACTIONS))
+        if seed is not None:
+            self.seed(seed)
+
+    # ------------------------------------------------------------------
+    # VecEnv interface
+    # ------------------------------------------------------------------
+
+    def reset(self):
+        """
+        Reset every game, using the seeds set by seed() if any.
+
+        Returns:
+            numpy.ndarray: The [N, 849] observations.
+        """
+        for idx, seed in enumerate(self._seeds):
+            if seed is not None or self._rngs[idx] is None:
+                self._rngs[idx] = np.random.default_rng(seed)
+        self._reset_seeds()
+        self._reset_games(self._games)
+        self._update_masks()
+        return self._observe()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64)
+
+    def step_wait(self):
+        """
+        Apply the pending actions to all games.
+
+        Returns:
+            tuple: Observations [N, 849], rewards [N], dones [N] and a list of info dicts.
+        """
+        rewards, dones = self._apply_actions(self._actions)
+        self._actions = None
+
+        infos = [{} for _ in range(self.num_envs)]
+        obs = self._observe()
+        ended = np.flatnonzero(dones)
+        if len(ended):
+            for idx in ended:
+                infos[idx]["terminal_observation"] = obs[idx].copy()
+                infos[idx]["TimeLimit.truncated"] = False
+            self._reset_games(ended)
+            obs = self._observe()
+        self._update_masks()
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def action_masks(self):
+        """
+        Return the valid action masks of all games.
+
+        Returns:
+            numpy.ndarray: Boolean [N, 79] array.
+        """
+        return self._masks.copy()
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = list(self._get_indices(indices))
+        if method_name == "action_masks":
+            return list(self._masks[indices])
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._get_indices(indices))
+
+    def _get_indices(self, indices):
+        return list(super()._get_indices(indices))
+
+    # ------------------------------------------------------------------
+    # Game logic
+    # ------------------------------------------------------------------
+
+    def _reset_games(self, games):
+        """
+        Start new games in the given slots.
+
+        Parameters:
+            games (numpy.ndarray): Indices of the games to reset.
+        """
+        for g in games:
+            rng = self._rngs[g]
+            if rng is None:
+                rng = self._rngs[g] = np.random.default_rng()
+
+            # Deal 3 cards to each player and stack three shuffled piles as the player deck.
+            city_cards = rng.permutation(N_CITIES)
+            self.hands[g, 0] = CITY_BITS[city_cards[:3]].sum()
+            self.hands[g, 1] = CITY_BITS[city_cards[3:6]].sum()
+            self.player_deck[g] = np.concatenate([rng.permutation(city_cards[start:start + 6])
+                                                  for start in (6, 12, 18)])
+            self.infection_deck[g] = rng.permutation(N_CITIES)
+
+        self.cubes[games] = 0
+        self.cube_supply[games] = INITIAL_CUBES
+        self.cures[games] = False
+        self.outbreak_count[games] = 0
+        self.player_deck_size[games] = self.player_deck.shape[1]
+        self.infection_deck_size[games] = N_CITIES
+        self.infection_discard[games] = False
+        self.player_discard[games] = False
+        self.locations[games] = RESEARCH_STATION
+        self.current_player[games] = 0
+        self.actions_taken[games] = 0
+        self.game_round[games] = 0
+
+        # Initial infections: two cities with 3 cubes, two with 2 and two with 1.
+        for n_cubes in (3, 3, 2, 2, 1, 1):
+            self._infect(games, n_cubes, protect=False)
+
+        for g in games:
+            self._choose_goal(g)
+        self.high_cure_prob[games] = self._cure_prob(games)
+
+    def _cure_prob(self, games):
+        """
+        Probability proxy of finding each cure: the best hand's share of the 4 cards needed.
+        """
+        counts = hand_color_counts(self.hands[games]).max(axis=1)
+        return np.where(self.cures[games], 1.0, np.minimum(1.0, counts / 4))
+
+    def _apply_actions(self, actions):
+        """
+        Execute one action in every game, including the end-of-turn phase where it applies.
+
+        Returns:
+            tuple: Rewards [N] and dones [N].
+        """
+        games = self._games
+        player = self.current_player.astype(np.intp)
+        partner = 1 - player
+        kind = ACTION_KIND[actions]
+        target = ACTION_TARGET[actions].astype(np.intp)
+        color = ACTION_COLOR[actions].astype(np.intp)
+
+        np.maximum(self.high_cure_prob, self._cure_prob(games), out=self.high_cure_prob)
+
+        prev_loc = self.locations[games, player].astype(np.intp)
+        hand = self.hands[games, player]
+        partner_hand = self.hands[games, partner]
+
+        # Movement: DIRECT spends the destination card, CHARTER the card of the current city.
+        # Like Player.take_action, both put the destination card on the discard pile.
+        moved = kind <= CHARTER
+        direct = kind == DIRECT
+        charter = kind == CHARTER
+        spent = np.where(direct, target, prev_loc)
+        spent_flight = direct | charter
+        hand = np.where(spent_flight, hand & ~CITY_BITS[spent], hand)
+        self.player_discard[games[spent_flight], target[spent_flight]] = True
+        loc = np.where(moved, target, prev_loc)
+        self.locations[games, player] = loc
+
+        # The Containment Specialist removes a cube when entering a city with 2 or more of a color.
+        containment = moved & (player == CONTAINMENT_PLAYER)
+        if containment.any():
+            crowded = self.cubes[games, loc] >= 2
+            containment &= crowded.any(axis=1)
+            g = games[containment]
+            c = crowded[containment].argmax(axis=1)
+            self.cubes[g, loc[containment], c] -= 1
+            self.cube_supply[g, c] += 1
+
+        # TREAT removes one cube, or all of them once the disease is cured.
+        treat = kind == TREAT
+        remaining = np.zeros(len(games), dtype=np.int8)
+        if treat.any():
+            g = games[treat]
+            c = color[treat]
+            l = loc[treat]
+            present = self.cubes[g, l, c]
+            removed = np.where(self.cures[g, c], present, 1).astype(np.int8)
+            self.cubes[g, l, c] = present - removed
+            self.cube_supply[g, c] += removed
+            remaining[treat] = present - removed
+
+        # SHARE KNOWLEDGE moves the current city card to whichever player does not hold it.
+        share = kind == SHARE
+        loc_bit = CITY_BITS[loc]
+        gives = share & ((hand & loc_bit) != 0)
+        takes = share & ~gives
+        hand = np.where(gives, hand & ~loc_bit, np.where(takes, hand | loc_bit, hand))
+        partner_hand = np.where(gives, partner_hand | loc_bit, np.where(takes, partner_hand & ~loc_bit, partner_hand))
+
+        # FIND CURE discards the first 4 cards of the color.
+        find = kind == FIND
+        for g in np.flatnonzero(find):
+            c = color[g]
+            self.cures[g, c] = True
+            cards = np.flatnonzero(hand_cards(hand[g]) & (CITY_COLOR == c))[:4]
+            hand[g] &= ~CITY_BITS[cards].sum()
+            self.player_discard[g, cards] = True
+
+        self.hands[games, player] = hand
+        self.hands[games, partner] = partner_hand
+
+        # Reward shaping, as in PandemicEnv.step.
+        rewards = np.zeros(len(games), dtype=np.float64)
+        find_goal = self.goal_find_cure
+        rewards += np.where(find_goal, 0.1 * (DISTANCE_MATRIX[prev_loc, RESEARCH_STATION]
+                                              - DISTANCE_MATRIX[loc, RESEARCH_STATION]), 0.0)
+        rewards += np.where(find, 3.0, 0.0)
+        share_goal = self.goal_share_location >= 0
+        share_loc = np.where(share_goal, self.goal_share_location, 0).astype(np.intp)
+        rewards += np.where(share_goal, 0.1 * (DISTANCE_MATRIX[prev_loc, share_loc]
+                                               - DISTANCE_MATRIX[loc, share_loc]), 0.0)
+        if share.any():
+            loc_color = CITY_COLOR[loc]
+            improved = self._cure_prob(games)[games, loc_color] > self.high_cure_prob[games, loc_color]
+            rewards += np.where(share & improved, 1.0, 0.0)
+        rewards += np.where(direct & ~self.cures[games, CITY_COLOR[target]], -0.1, 0.0)
+        rewards += np.where(charter & ~self.cures[games, CITY_COLOR[prev_loc]], -0.1, 0.0)
+        rewards += np.where(treat, np.where(remaining == 2, 0.3, 0.1), 0.0)
+
+        self.actions_taken += 1
+
+        dones = self.cures.all(axis=1)
+        rewards[dones] = 10
+
+        # End of turn: draw 2 player cards, infect, and pass the turn to the partner.
+        turn_end = (self.actions_taken == 4) & ~dones
+        if turn_end.any():
+            ending = games[turn_end]
+            deck_loss = self.player_deck_size[ending] <= 1
+            lost = ending[deck_loss]
+            rewards[lost] = -10
+            dones[lost] = True
+
+            drawing = ending[~deck_loss]
+            if len(drawing):
+                self.actions_taken[drawing] = 0
+                drawer = self.current_player[drawing].astype(np.intp)
+                for _ in range(2):
+                    self.player_deck_size[drawing] -= 1
+                    card = self.player_deck[drawing, self.player_deck_size[drawing]]
+                    self.hands[drawing, drawer] |= CITY_BITS[card]
+                for _ in range(INFECTION_RATE):
+                    self._infect(drawing, 1, protect=True)
+                self.game_round[drawing] += 1
+
+            infection_loss = (self.outbreak_count[ending] >= 4) | (self.cube_supply[ending] < 0).any(axis=1)
+            rewards[ending[infection_loss]] = -10
+            dones[ending[infection_loss]] = True
+
+            self.current_player[ending] = 1 - self.current_player[ending]
+            for g in ending:
+                self._choose_goal(g)
+
+        # Discard down to 6 cards.
+        counts = hand_cards(self.hands).sum(axis=2)
+        for g, p in zip(*np.nonzero(counts > MAX_HAND_SIZE)):
+            self._discard(g, p, counts[g, p] - MAX_HAND_SIZE)
+
+        return rewards, dones
+
+    def _infect(self, games, n_cubes, protect):
+        """
+        Draw one infection card in each given game and add cubes of the city's color.
+
+        Parameters:
+            games (numpy.ndarray): Indices of the games that draw.
+            n_cubes (int): Number of cubes to add.
+            protect (bool): Whether the Quarantine Specialist prevents infection in their city
+                and its neighbors.
+        """
+        self.infection_deck_size[games] -= 1
+        city = self.infection_deck[games, self.infection_deck_size[games]].astype(np.intp)
+        self.infection_discard[games, city] = True
+
+        if protect:
+            infected = ~ADJACENT_OR_SELF[city, self.locations[games, QUARANTINE_PLAYER]]
+            games, city = games[infected], city[infected]
+
+        color = CITY_COLOR[city]
+        present = self.cubes[games, city, color]
+        overflow = present + n_cubes > 3
+        self.cubes[games, city, color] = np.minimum(present + n_cubes, 3)
+        self.cube_supply[games, color] -= np.minimum(n_cubes, 3 - present)
+        for g, c, col in zip(games[overflow], city[overflow], color[overflow]):
+            self._outbreak(g, c, col)
+
+    def _outbreak(self, game, city, color):
+        """
+        Resolve an outbreak chain reaction in one game.
+
+        Neighbors gain one cube of the color; neighbors that already hold 3 cubes outbreak in
+        turn, in the same depth-first order as Board.outbreak.
+        """
+        cubes = self.cubes[game, :, color]
+        outbroken = 1 << int(city)
+        self.outbreak_count[game] += 1
+        stack = [iter(NEIGHBORS[city])]
+        while stack:
+            neighbor = next(stack[-1], None)
+            if neighbor is None:
+                stack.pop()
+            elif not outbroken & (1 << neighbor):
+                if cubes[neighbor] == 3:
+                    outbroken |= 1 << neighbor
+                    self.outbreak_count[game] += 1
+                    stack.append(iter(NEIGHBORS[neighbor]))
+                else:
+                    cubes[neighbor] += 1
+
+    def _choose_goal(self, game):
+        """
+        Choose the current player's goal, as goals.choose_player_goal() does.
+        """
+        player = int(self.current_player[game])
+        hands = (int(self.hands[game, player]), int(self.hands[game, 1 - player]))
+        locations = (int(self.locations[game, player]), int(self.locations[game, 1 - player]))
+        cures = self.cures[game]
+        counts = [[bin(hand & COLOR_BITS[color]).count("1") for color in range(N_COLORS)] for hand in hands]
+
+        self.goal_find_cure[game] = any(counts[0][c] >= 4 and not cures[c] for c in range(N_COLORS))
+        self.goal_share_location[game] = -1
+        if self.goal_find_cure[game]:
+            return
+
+        best_distance = [float("inf"), float("inf")]
+        best_location = [-1, -1]
+        for giver, receiver in ((0, 1), (1, 0)):
+            for color in range(N_COLORS):
+                if cures[color]:
+                    continue
+                num_receiver, num_giver = counts[receiver][color], counts[giver][color]
+                if num_receiver == 3 and num_giver >= 1:
+                    option = 0
+                elif num_receiver == 2 and num_giver in (1, 2):
+                    option = 1
+                else:
+                    continue
+                cards = hands[giver] & COLOR_BITS[color]
+                while cards:
+                    city = (cards & -cards).bit_length() - 1
+                    cards &= cards - 1
+                    total = DISTANCE_TABLE[city][locations[0]] + DISTANCE_TABLE[city][locations[1]]
+                    if total < best_distance[option]:
+                        best_distance[option] = total
+                        best_location[option] = city
+
+        if best_location[0] >= 0:
+            self.goal_share_location[game] = best_location[0]
+        elif best_location[1] >= 0:
+            self.goal_share_location[game] = best_location[1]
+
+    def _discard(self, game, player, n_discard):
+        """
+        Discard the cards that minimize h_cards + 0.5 * h_disc, as PandemicEnv.select_discard does.
+        """
+        hand = int(self.hands[game, player])
+        counts = [bin(hand & COLOR_BITS[color]).count("1") for color in range(N_COLORS)]
+        other = [bin(int(self.hands[game, 1 - player]) & COLOR_BITS[color]).count("1") for color in range(N_COLORS)]
+
+        _, splits = optimal_discard_splits(counts, other, self.cures[game], n_discard)
+        best_split = splits[0]
+
+        cards = hand_cards(np.int32(hand))
+        for color, amount in enumerate(best_split):
+            if amount:
+                dropped = np.flatnonzero(cards & (CITY_COLOR == color))[:amount]
+                self.hands[game, player] &= ~CITY_BITS[dropped].sum()
+                self.player_discard[game, dropped] = True
+
+    # ------------------------------------------------------------------
+    # Observations and masks
+    # ------------------------------------------------------------------
+
+    def _observe(self):
+        """
+        Write the dynamic slots of all observations and return a copy of the buffer.
+        """
+        games = self._games
+        city_block = self._city_block
+
+        city_block[:, :, SHARE_SLOT] = 0
+        sharing = np.flatnonzero(self.goal_share_location >= 0)
+        city_block[sharing, self.goal_share_location[sharing], SHARE_SLOT] = 1
+        city_block[:, :, CUBE_SLOTS[0]:CUBE_SLOTS[-1] + 1] = self.cubes / 3
+        cards = hand_cards(self.hands)
+        for player in range(2):
+            city_block[:, :, HAND_SLOTS[player]] = cards[:, player]
+            city_block[:, :, LOCATION_SLOTS[player]] = 0
+            city_block[games, self.locations[:, player], LOCATION_SLOTS[player]] = 1
+        city_block[:, :, INFECTION_DISCARD_SLOT] = self.infection_discard
+        city_block[:, :, PLAYER_DISCARD_SLOT] = self.player_discard
+
+        globals_block = self._obs[:, GLOBALS_OFFSET:]
+        globals_block[:, 0] = self.game_round / 10
+        globals_block[:, 1] = self.current_player
+        globals_block[:, 2] = self.actions_taken / 4
+        globals_block[:, 3] = self.outbreak_count / 4
+        globals_block[:, 4] = 0  # Infection rate index, which stays 0 without Epidemic cards.
+        globals_block[:, 5:8] = self.cures
+        globals_block[:, 8] = self.goal_find_cure
+        return self._obs.copy()
+
+    def _update_masks(self):
+        """
+        Compute the valid action masks of all games, as Player.action_mask does.
+        """
+        games = self._games
+        player = self.current_player.astype(np.intp)
+        loc = self.locations[games, player].astype(np.intp)
+        hand = self.hands[games, player]
+        partner_hand = self.hands[games, 1 - player]
+        cards = hand_cards(hand)
+        flight_targets = ~ADJACENT_OR_SELF[loc]
+        loc_bit = CITY_BITS[loc]
+        masks = self._masks
+
+        masks[:, :N_CITIES] = ADJACENT[loc]
+        masks[:, N_CITIES:2 * N_CITIES] = cards & flight_targets
+        masks[:, 2 * N_CITIES:3 * N_CITIES] = flight_targets & ((hand & loc_bit) != 0)[:, None]
+        masks[:, 3 * N_CITIES:3 * N_CITIES + N_COLORS] = self.cubes[games, loc] > 0
+        masks[:, 3 * N_CITIES + N_COLORS] = (loc == self.locations[games, 1 - player]) \
+            & (((hand | partner_hand) & loc_bit) != 0)
+        masks[:, 3 * N_CITIES + N_COLORS + 1:] = (loc == RESEARCH_STATION)[:, None] \
+            & (cards.astype(np.int8) @ COLOR_ONEHOT >= 4) & ~self.cures